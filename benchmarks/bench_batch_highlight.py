@@ -0,0 +1,61 @@
+"""
+Benchmark the batched (NumPy) fuzzy scoring of Highlighter.masks against the
+scalar path (one suffix automaton walk per token and synonym), on entries with
+many sentences and many synonyms.
+
+Usage: python benchmarks/bench_batch_highlight.py
+"""
+
+import random
+import sys
+import timeit
+
+import wordref.longest
+from wordref.longest import Highlighter
+
+LETTERS = "αβγδεζηθικλμνξοπρστυφχψωάέήίόύώ"
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(LETTERS) for _ in range(rng.randint(2, 12)))
+
+
+def make_entry(n_sentences: int, n_synonyms: int, seed: int = 0) -> tuple[list[str], set[str]]:
+    rng = random.Random(seed)
+    vocabulary = [random_word(rng) for _ in range(2000)]
+    synonyms = {random_word(rng) for _ in range(n_synonyms)}
+    # Some inflected synonyms in the sentences, so that there is something to highlight.
+    vocabulary += [synonym + "ς" for synonym in synonyms]
+    sentences = [" ".join(rng.choice(vocabulary) for _ in range(20)) + "." for _ in range(n_sentences)]
+    return sentences, synonyms
+
+
+def bench(highlighter: Highlighter, sentences: list[str], number: int = 10) -> float:
+    return min(timeit.repeat(lambda: highlighter.masks(sentences), number=number, repeat=5)) / number
+
+
+def main() -> None:
+    if wordref.longest.np is None:
+        sys.exit("NumPy is not installed: pip install .[fast]")
+
+    print(f"{'sentences':>9} {'synonyms':>8} {'scalar':>10} {'numpy':>10}")
+    for n_sentences, n_synonyms in [(3, 5), (10, 10), (30, 20), (100, 30)]:
+        sentences, synonyms = make_entry(n_sentences, n_synonyms)
+        highlighter = Highlighter(synonyms)
+
+        timings = {}
+        for name, min_pairs in [("scalar", sys.maxsize), ("numpy", 0)]:
+            wordref.longest.BATCH_MIN_PAIRS = min_pairs
+            timings[name] = bench(highlighter, sentences)
+            masks = highlighter.masks(sentences)
+            if name == "scalar":
+                expected = masks
+            assert masks == expected, "The batched masks differ from the scalar ones."
+
+        print(
+            f"{n_sentences:>9} {n_synonyms:>8} {timings['scalar'] * 1e3:>8.2f}ms {timings['numpy'] * 1e3:>8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
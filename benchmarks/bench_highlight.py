@@ -0,0 +1,123 @@
+"""
+Benchmark wordref.longest.highlight_synonyms on long example sentences with
+large synonym sets, against the previous implementation (token x synonym
+get_delta calls with the ad hoc LCS, and repeated sentence.replace).
+
+Usage: python benchmarks/bench_highlight.py
+"""
+
+import re
+import timeit
+
+from wordref.longest import get_highlighter, highlight_synonyms, normalize_greek_word
+
+SENTENCES = [
+    (
+        "Η μητέρα μου αγαπάει πολύ την οικογένειά της, τα παλιά βιβλία και το καλοκαίρι στο νησί, "
+        "και αγάπησε από μικρή τη θάλασσα, τους ανθρώπους του χωριού και τις αγαπημένες της συνήθειες."
+    ),
+    (
+        "Όλοι αγαπούσαν εκείνο το τραγούδι που έλεγε ο παππούς (με τη βραχνή φωνή του) κάθε βράδυ, "
+        "όταν η γιαγιά μαγείρευε το αγαπημένο φαγητό των παιδιών και οι γείτονες αγαπούσαν να ακούνε."
+    ),
+    (
+        "My mother has always loved her family, old books, the long summers on the island and the sea, "
+        "and she cherishes the quiet evenings when everyone who loves her gathers in the garden."
+    ),
+    (
+        "Everyone adored that song, the one our grandfather sang (with his hoarse voice) every evening, "
+        "while the children, who were fond of his stories, treasured every single word of it."
+    ),
+]
+SYNONYMS = [
+    {
+        "αγαπάω",
+        "αγαπώ",
+        "λατρεύω",
+        "συμπαθώ",
+        "εκτιμώ",
+        "νοιάζομαι",
+        "αγάπη",
+        "αγαπημένος",
+        "στοργή",
+        "ερωτεύομαι",
+    },
+    {
+        "love",
+        "adore",
+        "cherish",
+        "be fond of",
+        "like",
+        "care for",
+        "be in love with",
+        "treasure",
+        "loved",
+        "lover",
+    },
+]
+
+
+def legacy_LCS(a: str, b: str) -> int:
+    if a == b:
+        return len(a)
+    var = 0
+    while a:
+        i = 1
+        while True:
+            _buffer = a[:i]
+            if _buffer in b and i < len(a):
+                i += 1
+            else:
+                break
+        if i - 1 > var:
+            var = i - 1
+        a = a[i:]
+    return var
+
+
+def legacy_get_delta(a: str, b: str) -> float:
+    aa = normalize_greek_word(a)
+    bb = normalize_greek_word(b)
+    max_length = max(len(aa), len(bb))
+    m = max(legacy_LCS(aa, bb), legacy_LCS(bb, aa))
+    return (max_length - m) / max_length
+
+
+def legacy_highlight_synonyms(sentence: str, synonyms: set[str]) -> str:
+    for word in set(sentence.split()):
+        word = re.sub(r"\(|\)|,|\.|", "", word)
+        for reference in synonyms:
+            if legacy_get_delta(word, reference) <= 0.3:
+                sentence = sentence.replace(word, f"**{word}**")
+                break
+    return sentence
+
+
+def main() -> None:
+    pairs = [(sentence, synonyms) for sentence in SENTENCES for synonyms in SYNONYMS]
+
+    number = 20
+    legacy = min(
+        timeit.repeat(
+            lambda: [legacy_highlight_synonyms(s, syn) for s, syn in pairs], number=number, repeat=5
+        )
+    )
+
+    def fresh():
+        get_highlighter.cache_clear()
+        return [highlight_synonyms(s, syn) for s, syn in pairs]
+
+    cold = min(timeit.repeat(fresh, number=number, repeat=5))
+    warm = min(
+        timeit.repeat(lambda: [highlight_synonyms(s, syn) for s, syn in pairs], number=number, repeat=5)
+    )
+
+    per_call = 1e3 / (number * len(pairs))
+    print(f"{len(pairs)} sentence / synonym set pairs")
+    print(f"legacy:                {legacy * per_call:7.3f} ms/sentence")
+    print(f"automata (cold cache): {cold * per_call:7.3f} ms/sentence ({legacy / cold:.1f}x)")
+    print(f"automata (warm cache): {warm * per_call:7.3f} ms/sentence ({legacy / warm:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Micro-benchmark of wordref.parse_words on the word rows of the Wordref fixtures.
+
+Compares the compiled AttributeStripper with the previous implementation
+(one re.sub per attribute, repeated until fixpoint), and checks that both
+return the same words.
+
+Usage: python benchmarks/bench_parse_words.py
+"""
+
+import re
+import timeit
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from utils import is_english
+from wordref.wordref import ATTRIBUTES_EL, ATTRIBUTES_EN, parse_words
+
+FIXTURES = Path(__file__).parent.parent / "tests" / "fixtures" / "wordref"
+
+# Real row texts, with the irregular spacing and stacked attributes found on Wordref.
+EXTRA_CORPUS = [
+    "αγαπάω, αγαπώ ρ μ",
+    "ερωτεύομαι ρ αμ + πρόθ",
+    "σκοτώνω την ώρα μου ρ έκφρ",
+    "κουβαλάω ρ μ + πρόθ",
+    "ζω ρ αμ + επίρ",
+    "σούπερ επίθ άκλ",
+    "καθημερινά επίρ",
+    "ημερήσια διάταξη ουσ θηλ",
+    "σπίτι ουσ ουδ",
+    "  δρόμος ουσ αρσ  ",
+    "εκ των ενόντων φρ ως επίρ",
+    "pass the time vtr phrasal sep",
+    "fall in love with vtr + prep",
+    "house n",
+    "go vi",
+    "quickly adv",
+    "take it easy v expr",
+    "love vtr +",
+    "μη διαθέσιμη μετάφραση",
+]
+
+
+def legacy_parse_words(text: str) -> list[str]:
+    attributes = ATTRIBUTES_EN if is_english(text) else ATTRIBUTES_EL
+
+    while True:
+        original_text = text
+        text = text.strip()
+        for att in attributes:
+            pattern = re.escape(att) + r"$"
+            text = re.sub(pattern, "", text)
+            text = re.sub(r"\+$", "", text)
+        if original_text == text:
+            break
+
+    return text.split(", ")
+
+
+def load_corpus() -> list[str]:
+    corpus = list(EXTRA_CORPUS)
+    for path in sorted(FIXTURES.glob("*.html")):
+        soup = BeautifulSoup(path.read_text(encoding="utf-8"), "html.parser")
+        for cell in soup.find_all("td", {"class": ["FrWrd", "ToWrd"]}):
+            corpus.append(cell.text)
+    return corpus
+
+
+def main() -> None:
+    corpus = load_corpus()
+    for text in corpus:
+        assert parse_words(text) == legacy_parse_words(text), text
+
+    number = 20
+    legacy = min(timeit.repeat(lambda: [legacy_parse_words(t) for t in corpus], number=number, repeat=5))
+    compiled = min(timeit.repeat(lambda: [parse_words(t) for t in corpus], number=number, repeat=5))
+    per_row = 1e6 / (number * len(corpus))
+
+    print(f"{len(corpus)} row texts")
+    print(f"legacy:   {legacy * per_row:7.2f} µs/row")
+    print(f"compiled: {compiled * per_row:7.2f} µs/row ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Benchmark suite of the scrapers and renderers, on the recorded pages of tests/cassettes.
+
+Every stage runs offline: fetch_page is replaced by a lookup in the cassette of
+the tests (cf. replay.py), so the timings only measure parsing and rendering. For every stage, reports the
+p50 / p95 time per call and the peak memory of one call (tracemalloc).
+
+Save a run with --save, and compare a later run against it with --baseline:
+the stages whose p50 or peak memory grew by more than --tolerance are reported,
+and the exit code is 1.
+
+Usage:
+    python benchmarks/bench_suite.py --save before.json
+    python benchmarks/bench_suite.py --baseline before.json --stage wiktionary
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+from bs4 import BeautifulSoup
+
+import wiktionary.wiktionary
+import wordref.wordref
+from cache import Page, configure_page_cache
+from lexicon.inflections import configure_inflections
+from lexicon.lexicon import configure_lexicon
+from pronunciation.forvo import Forvo
+from replay import Cassette
+from wiktionary.embed_message import embed_message
+from wiktionary.wiktionary import WiktionaryQuery, _parse_conjugation, parse_wiktionary_pos
+from wordref.entry import Entry
+from wordref.longest import get_highlighter, highlight_synonyms
+from wordref.wordref import Wordref, entry_cache
+
+FIXTURES = Path(__file__).parent.parent / "tests" / "fixtures"
+
+CASSETTE = Cassette(Path(__file__).parent.parent / "tests" / "cassettes" / "upstream.json")
+
+
+def read_fixture(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
+
+
+async def fetch_recorded(url: str, headers: dict[str, str] | None = None) -> Page:
+    recorded = CASSETTE.get(url)
+    if recorded is None:
+        return Page(url, 404, b"")
+    status, body = recorded
+    return Page(url, status, body, from_cache=True)
+
+
+def run_async(loop: asyncio.AbstractEventLoop, coroutine_function: Callable) -> Callable[[], None]:
+    return lambda: loop.run_until_complete(coroutine_function())
+
+
+def build_stages(loop: asyncio.AbstractEventLoop) -> dict[str, Callable[[], None]]:
+    """Return the stages by name, each a callable doing one unit of work."""
+    stages: dict[str, Callable[[], None]] = {}
+
+    # Wordref: fetch (from the cassette) and parse, bypassing the entry cache.
+    for word in ["ημερήσιος", "αγαπάω", "μπλαμπλα"]:
+
+        async def try_fetch_entry(word: str = word) -> None:
+            entry_cache.clear()
+            await Wordref(word, True, True, 1, 5).try_fetch_entry()
+
+        stages[f"wordref.try_fetch_entry[{word}]"] = run_async(loop, try_fetch_entry)
+
+    # Rendering of an already parsed entry.
+    html = read_fixture("wordref/gren_agapao.html").decode()
+    parsed = Wordref("αγαπάω", True, True, 1, 5).parse_entry(html).to_parsed()
+
+    def add_embed() -> None:
+        Entry.from_parsed(parsed, True, 1, 5, False).add_embed()
+
+    def highlight() -> None:
+        # A new entry comes with a new synonym set: start with no highlighter.
+        get_highlighter.cache_clear()
+        for gr_sentence, en_sentence in dict(parsed.sentences).values():
+            highlight_synonyms(gr_sentence, parsed.gr_synonyms)
+            highlight_synonyms(en_sentence, parsed.en_synonyms)
+
+    stages["wordref.Entry.add_embed[αγαπάω]"] = add_embed
+    stages["wordref.highlight_synonyms[αγαπάω]"] = highlight
+
+    # Wiktionary: parsing the soup is part of the cost of every query.
+    for word, language, name in [
+        ("τραπέζι", "greek", "wiktionary/el_trapezi.html"),
+        ("table", "english", "wiktionary/en_table.html"),
+    ]:
+        body = read_fixture(name)
+
+        def pos(word: str = word, language: str = language, body: bytes = body) -> None:
+            parse_wiktionary_pos(WiktionaryQuery.from_html(word, language, body), language)
+
+        stages[f"wiktionary.parse_wiktionary_pos[{word}]"] = pos
+
+    for word, name in [("αγαπώ", "wiktionary/el_agapo.html"), ("ξέρω", "wiktionary/el_xero.html")]:
+        body = read_fixture(name)
+
+        def conjugation(word: str = word, body: bytes = body) -> None:
+            _parse_conjugation(WiktionaryQuery.from_html(word, "greek", body))
+
+        stages[f"wiktionary._parse_conjugation[{word}]"] = conjugation
+
+    for word, language in [("τραπέζι", "greek"), ("table", "english")]:
+
+        async def embed(word: str = word, language: str = language) -> None:
+            await embed_message(word, language)
+
+        stages[f"wiktionary.embed_message[{word}]"] = run_async(loop, embed)
+
+    # Forvo
+    forvo_body = read_fixture("forvo/efcharisto.html")
+
+    def pronunciations() -> None:
+        forvo = Forvo("ευχαριστώ", "el")
+        forvo.html = BeautifulSoup(forvo_body, "html.parser")
+        forvo.get_pronunciations()
+
+    stages["forvo.get_pronunciations[ευχαριστώ]"] = pronunciations
+
+    return stages
+
+
+def measure(stage: Callable[[], None], number: int, warmup: int = 3) -> dict[str, float]:
+    for _ in range(warmup):
+        stage()
+
+    samples = []
+    for _ in range(number):
+        start = time.perf_counter()
+        stage()
+        samples.append(time.perf_counter() - start)
+
+    # Apart from the timings: tracemalloc slows everything down.
+    tracemalloc.start()
+    stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": statistics.median(samples) * 1e3,
+        "p95_ms": statistics.quantiles(samples, n=20, method="inclusive")[18] * 1e3,
+        "peak_kib": peak / 1024,
+    }
+
+
+def find_regressions(
+    results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], tolerance: float
+) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ["p50_ms", "peak_kib"]:
+            before, after = baseline[name][metric], result[metric]
+            if after > before * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {metric} {before:.2f} -> {after:.2f} (+{after / before - 1:.0%})"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--number", type=int, default=50, help="timed calls per stage")
+    parser.add_argument("--stage", default="", help="only run the stages containing this string")
+    parser.add_argument("--save", type=Path, help="write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="compare against the results of a previous --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed growth before a regression")
+    args = parser.parse_args()
+
+    # The stages log and print at every call.
+    logging.disable(logging.INFO)
+    wordref.wordref.fetch_page = fetch_recorded
+    wiktionary.wiktionary.fetch_page = fetch_recorded
+
+    results: dict[str, dict[str, float]] = {}
+    loop = asyncio.new_event_loop()
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = f"{tmp}/cache.sqlite3"
+        configure_page_cache(cache_path)
+        configure_lexicon(cache_path)
+        configure_inflections(cache_path)
+
+        print(f"{'stage':<48}{'p50 (ms)':>10}{'p95 (ms)':>10}{'peak (KiB)':>12}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            stages = build_stages(loop)
+        for name, stage in stages.items():
+            if args.stage not in name:
+                continue
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = measure(stage, args.number)
+            results[name] = result
+            print(f"{name:<48}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['peak_kib']:>12.0f}")
+    loop.close()
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression over {args.tolerance:.0%} against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
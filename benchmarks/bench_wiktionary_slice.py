@@ -0,0 +1,86 @@
+"""
+Benchmark of WiktionaryQuery.from_html on large English Wiktionary pages.
+
+Compares parsing only the Greek section (slice_language_section) with the
+previous implementation (parsing the whole page, then removing the Ancient
+Greek section from the soup): time per page and peak memory (tracemalloc).
+
+The large pages are built from the en_table fixture, with its English section
+repeated under the names of other languages, around a Greek section: short
+words have dozens of language sections on English Wiktionary.
+
+Usage: python benchmarks/bench_wiktionary_slice.py
+"""
+
+import functools
+import logging
+import re
+import timeit
+import tracemalloc
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from wiktionary.wiktionary import WiktionaryQuery, parse_wiktionary_pos
+
+FIXTURES = Path(__file__).parent.parent / "tests" / "fixtures" / "wiktionary"
+LANGUAGES = ["Albanian", "Ancient_Greek", "Catalan", "Dutch", "Esperanto", "Finnish", "German", "Greek"]
+
+
+def build_page(sections: int) -> bytes:
+    """An English page of about that many language sections, the Greek one among them."""
+    html = (FIXTURES / "en_table.html").read_bytes()
+    start = html.index(b'<div class="mw-heading mw-heading2"><h2 id="English">')
+    end = html.index(b'<div class="mw-heading mw-heading2"><h2 id="French">')
+    english = html[start:end]
+
+    body = b""
+    for idx in range(sections):
+        language = LANGUAGES[idx] if idx < len(LANGUAGES) else f"Language_{idx}"
+        body += re.sub(rb'id="English">English<', f'id="{language}">{language}<'.encode(), english)
+    return html[:start] + body + html[end:]
+
+
+def legacy_from_html(word: str, language: str, html: bytes) -> WiktionaryQuery:
+    query = WiktionaryQuery()
+    query.word = word
+    query.language = language
+    query.soup = BeautifulSoup(html, "html.parser")
+    WiktionaryQuery.remove_ancient_greek(query.soup, language)
+    return query
+
+
+def peak_memory(function) -> int:
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    logging.disable(logging.INFO)
+
+    for sections in (8, 40, 160):
+        page = build_page(sections)
+        sliced = WiktionaryQuery.from_html("τραπέζι", "english", page)
+        assert "Noun" in parse_wiktionary_pos(sliced, "english")
+
+        number = 5
+        legacy_parse = functools.partial(legacy_from_html, "τραπέζι", "english", page)
+        new_parse = functools.partial(WiktionaryQuery.from_html, "τραπέζι", "english", page)
+        legacy = min(timeit.repeat(legacy_parse, number=number, repeat=3))
+        new = min(timeit.repeat(new_parse, number=number, repeat=3))
+        legacy_peak = peak_memory(legacy_parse)
+        new_peak = peak_memory(new_parse)
+
+        print(f"{sections} sections, {len(page) / 1e6:.2f} MB")
+        print(f"  whole page: {legacy / number * 1e3:8.2f} ms/page {legacy_peak / 1e6:7.2f} MB peak")
+        print(
+            f"  section:    {new / number * 1e3:8.2f} ms/page {new_peak / 1e6:7.2f} MB peak "
+            f"({legacy / new:.1f}x faster)"
+        )
+
+
+if __name__ == "__main__":
+    main()
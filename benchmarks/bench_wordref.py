@@ -0,0 +1,64 @@
+"""
+Benchmark the parsing of Wordref pages on the fixtures of tests/fixtures/wordref.
+
+Compares the whole-page parse with the restricted one (only the WRD tables),
+for every available parser backend.
+
+Usage: python benchmarks/bench_wordref.py
+"""
+
+import contextlib
+import io
+import tempfile
+import timeit
+from pathlib import Path
+
+from lexicon.lexicon import configure_lexicon
+from wordref.wordref import WRD_TABLES, Wordref
+
+FIXTURES = Path(__file__).parent.parent / "tests" / "fixtures" / "wordref"
+PAGES = {
+    "gren_imerisios.html": "ημερήσιος",
+    "gren_agapao.html": "αγαπάω",
+    "gren_blabla.html": "μπλαμπλα",
+}
+
+
+def available_parsers() -> list[str]:
+    parsers = ["html.parser"]
+    with contextlib.suppress(ImportError):
+        import lxml  # noqa: F401
+
+        parsers.append("lxml")
+    return parsers
+
+
+def bench(html: str, word: str, parser: str, parse_only, number: int) -> float:
+    import wordref.wordref
+
+    wordref.wordref.PARSER = parser
+
+    def parse():
+        Wordref(word, True, False, 0, 2).parse_entry(html, parse_only=parse_only)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return min(timeit.repeat(parse, number=number, repeat=5)) / number
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_lexicon(f"{tmp}/lexicon.sqlite3")
+
+        print(f"{'page':<22}{'parser':<13}{'full (ms)':>11}{'WRD only (ms)':>15}{'speedup':>9}")
+        for name, word in PAGES.items():
+            html = (FIXTURES / name).read_text(encoding="utf-8")
+            for parser in available_parsers():
+                full = bench(html, word, parser, None, number=20)
+                restricted = bench(html, word, parser, WRD_TABLES, number=20)
+                print(
+                    f"{name:<22}{parser:<13}{full * 1e3:>11.2f}{restricted * 1e3:>15.2f}{full / restricted:>8.1f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
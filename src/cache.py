@@ -0,0 +1,326 @@
+"""
+Persistent page cache shared by every upstream (Wordref, Wiktionary, Forvo).
+
+Pages are stored in a single SQLite file keyed by their normalized URL.
+Fresh pages are served without touching the network, stale pages are
+revalidated with ETag / Last-Modified, and the least recently used pages
+are evicted once the store grows over its size budget.
+
+SQLite is blocking: fetch_page runs the queries in a thread (asyncio.to_thread),
+so that a slow disk or a large eviction does not stall the event loop.
+
+Example usage: page = await fetch_page("https://www.wordreference.com/gren/χαρά")
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Callable
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
+
+from metrics import get_metrics
+from ratelimit import get_rate_limiter
+from session import get_session
+from tracing import span
+
+DEFAULT_CACHE_PATH = "page_cache.sqlite3"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Seconds: the access time of a page is updated at most this often.
+ACCESS_RESOLUTION = 60
+
+DAY = 24 * 60 * 60
+DEFAULT_TTL = DAY
+HOST_TTLS = {
+    "www.wordreference.com": 7 * DAY,
+    "el.wiktionary.org": DAY,
+    "en.wiktionary.org": DAY,
+    "forvo.com": DAY,
+    "audio00.forvo.com": 30 * DAY,
+}
+
+# The random page changes on every request: never cache it.
+UNCACHED_PATHS = ["/random/"]
+
+
+class UpstreamError(Exception):
+    def __init__(self, url: str, status: int):
+        super().__init__(f"{status} for {url}")
+        self.url = url
+        self.status = status
+
+
+@dataclass
+class Page:
+    url: str
+    status: int
+    body: bytes
+    from_cache: bool = False
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            raise UpstreamError(self.url, self.status)
+
+
+@dataclass
+class CachedPage:
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    expires_at: float
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+
+def normalize_url(url: str) -> str:
+    """
+    Return a canonical form of url, used as the cache key.
+
+    Percent-encoded and raw unicode paths map to the same key, as do
+    accented words in their composed and decomposed forms.
+
+    >>> normalize_url("HTTPS://www.wordreference.com/gren/%CF%87%CE%B1%CF%81%CE%AC")
+    'https://www.wordreference.com/gren/%CF%87%CE%B1%CF%81%CE%AC'
+    >>> normalize_url("https://www.wordreference.com/gren/χαρά#top")
+    'https://www.wordreference.com/gren/%CF%87%CE%B1%CF%81%CE%AC'
+    """
+    parts = urlsplit(url)
+    path = unicodedata.normalize("NFC", unquote(parts.path)) or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), quote(path), query, ""))
+
+
+def get_ttl(url: str) -> float:
+    return HOST_TTLS.get(urlsplit(url).netloc.lower(), DEFAULT_TTL)
+
+
+def is_cacheable(url: str) -> bool:
+    path = urlsplit(url).path
+    return not any(path.startswith(prefix) for prefix in UNCACHED_PATHS)
+
+
+class PageCache:
+    """
+    SQLite backed store of the pages, evicted in least recently used order.
+
+    The methods are blocking, and may be called from several threads at once.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+        self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get(self, key: str) -> CachedPage | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT body, etag, last_modified, expires_at, accessed_at FROM pages WHERE url = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            *page, accessed_at = row
+            # The eviction order does not need more than a minute of precision:
+            # spare the hits of the hot pages a write.
+            now = time.time()
+            if now - accessed_at > ACCESS_RESOLUTION:
+                self.connection.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (now, key))
+                self.connection.commit()
+            return CachedPage(*page)
+
+    def put(self, key: str, body: bytes, etag: str | None, last_modified: str | None, ttl: float) -> None:
+        now = time.time()
+        size = len(body)
+        with self.lock:
+            old_size = self.connection.execute("SELECT size FROM pages WHERE url = ?", (key,)).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, body, etag, last_modified, now + ttl, now, size),
+            )
+            self.connection.commit()
+            self.total_bytes += size - (old_size[0] if old_size else 0)
+            self._evict()
+
+    def refresh(self, key: str, ttl: float) -> None:
+        """Extend the lifetime of a page that was revalidated (304: Not Modified)."""
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "UPDATE pages SET expires_at = ?, accessed_at = ? WHERE url = ?", (now + ttl, now, key)
+            )
+            self.connection.commit()
+
+    def evict(self) -> None:
+        """Delete the least recently used pages until the store fits in max_bytes."""
+        with self.lock:
+            self._evict()
+
+    def _evict(self) -> None:
+        excess = self.total_bytes - self.max_bytes
+        if excess <= 0:
+            return
+        # The oldest pages, up to the first one that brings the total under the budget.
+        evicted = self.connection.execute(
+            """
+            DELETE FROM pages WHERE url IN (
+                SELECT url FROM (
+                    SELECT url, SUM(size) OVER (ORDER BY accessed_at, rowid) - size AS preceding
+                    FROM pages
+                )
+                WHERE preceding < ?
+            )
+            RETURNING size
+            """,
+            (excess,),
+        ).fetchall()
+        self.connection.commit()
+        self.total_bytes -= sum(size for (size,) in evicted)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+_page_cache: PageCache | None = None
+
+
+def configure_page_cache(path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES) -> PageCache:
+    global _page_cache
+
+    if _page_cache is not None:
+        _page_cache.close()
+    _page_cache = PageCache(path, max_bytes)
+    return _page_cache
+
+
+def get_page_cache() -> PageCache:
+    if _page_cache is None:
+        return configure_page_cache()
+    return _page_cache
+
+
+# Hooks for replay.py: where the requests are actually sent (f.e. a local stub
+# server), and a callback receiving every page fetched from upstream.
+_upstream_url: Callable[[str], str] | None = None
+_on_response: Callable[[Page], None] | None = None
+
+
+def configure_upstream(
+    upstream_url: Callable[[str], str] | None = None,
+    on_response: Callable[[Page], None] | None = None,
+) -> None:
+    """Route the requests through upstream_url(url), and report the responses to on_response."""
+    global _upstream_url, _on_response
+
+    _upstream_url = upstream_url
+    _on_response = on_response
+
+
+def get_upstream_url(url: str) -> str:
+    return _upstream_url(url) if _upstream_url is not None else url
+
+
+def observe_upstream(url: str, status: int, start: float) -> None:
+    """Record an upstream response, start being the perf_counter before the request."""
+    host = urlsplit(url).netloc.lower()
+    get_metrics().observe("upstream_seconds", time.perf_counter() - start, host=host)
+    get_metrics().increment("upstream_responses", host=host, status=str(status))
+
+
+def received(page: Page, start: float, status: int | None = None) -> Page:
+    """
+    Account for a response of upstream, and report the page to the on_response hook.
+    status is the one of the response, if it differs from the page's (304: Not Modified).
+    """
+    status = page.status if status is None else status
+    observe_upstream(page.url, status, start)
+    transferred = 0 if status == 304 else len(page.body)
+    get_metrics().increment("upstream_bytes", transferred, host=urlsplit(page.url).netloc.lower())
+    if _on_response is not None:
+        _on_response(page)
+    return page
+
+
+async def fetch_page(url: str, headers: dict[str, str] | None = None) -> Page:
+    """
+    GET url through the page cache.
+
+    Only successful (200) responses are stored. Errors are returned as is,
+    it is up to the caller to decide what a 404 means.
+    """
+    with span("fetch", url=url) as fetch:
+        if is_cacheable(url):
+            page = await _fetch_cached_page(url, headers)
+        else:
+            page = await _fetch_page(url, headers or {})
+        fetch.set(status=page.status, from_cache=page.from_cache)
+        return page
+
+
+async def _fetch_cached_page(url: str, headers: dict[str, str] | None) -> Page:
+    cache = get_page_cache()
+    key = normalize_url(url)
+    cached = await asyncio.to_thread(cache.get, key)
+    if cached is not None and cached.is_fresh:
+        get_metrics().increment("page_cache_requests", result="hit")
+        return Page(url, 200, cached.body, from_cache=True)
+
+    request_headers = dict(headers or {})
+    if cached is not None:
+        if cached.etag:
+            request_headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            request_headers["If-Modified-Since"] = cached.last_modified
+
+    await get_rate_limiter().acquire(url)
+    start = time.perf_counter()
+    async with get_session(url).get(get_upstream_url(url), headers=request_headers) as response:
+        if response.status == 304 and cached is not None:
+            get_metrics().increment("page_cache_requests", result="revalidated")
+            await asyncio.to_thread(cache.refresh, key, get_ttl(url))
+            return received(Page(url, 200, cached.body, from_cache=True), start, response.status)
+
+        body = await response.read()
+        if response.status == 200:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            await asyncio.to_thread(cache.put, key, body, etag, last_modified, get_ttl(url))
+
+        get_metrics().increment("page_cache_requests", result="miss")
+        return received(Page(url, response.status, body), start)
+
+
+async def _fetch_page(url: str, headers: dict[str, str]) -> Page:
+    await get_rate_limiter().acquire(url)
+    start = time.perf_counter()
+    async with get_session(url).get(get_upstream_url(url), headers=headers) as response:
+        body = await response.read()
+        return received(Page(url, response.status, body), start)
@@ -0,0 +1,155 @@
+"""
+Greeklish to greek transliteration.
+
+Greeklish is ambiguous: "x" can be χ or ξ, "i" can be ι, η or υ, "th" is θ but
+"t" + "h" is τη... The rules below are stored in a trie over their latin keys,
+so that every rule matching at a position (single letters and digraphs) is
+found in one walk. Candidates are generated with a beam search, ranked by the
+number of rules applied plus the penalty of the less common readings, and the
+best candidate known to the lexicon wins.
+
+Example usage: transliterate("thalassa") => "θαλασσα"
+"""
+
+import heapq
+import re
+
+from lexicon.lexicon import Lexicon
+
+# fmt: off
+# latin: [(greek, penalty)], the most common reading first with no penalty.
+RULES: dict[str, list[tuple[str, int]]] = {
+    "a": [("α", 0)],
+    "b": [("β", 0), ("μπ", 1)],
+    "c": [("σ", 0), ("κ", 1)],
+    "d": [("δ", 0), ("ντ", 1)],
+    "e": [("ε", 0), ("αι", 1), ("η", 2)],
+    "f": [("φ", 0)],
+    "g": [("γ", 0), ("γκ", 2)],
+    "h": [("η", 0), ("χ", 1)],
+    "i": [("ι", 0), ("η", 1), ("υ", 2), ("ει", 2), ("οι", 2)],
+    "j": [("τζ", 0)],
+    "k": [("κ", 0)],
+    "l": [("λ", 0)],
+    "m": [("μ", 0)],
+    "n": [("ν", 0)],
+    "o": [("ο", 0), ("ω", 1)],
+    "p": [("π", 0)],
+    "q": [("κ", 0)],
+    "r": [("ρ", 0)],
+    "s": [("σ", 0)],
+    "t": [("τ", 0)],
+    "u": [("υ", 0), ("ου", 1)],
+    "v": [("β", 0)],
+    "w": [("ω", 0)],
+    "x": [("χ", 0), ("ξ", 1)],
+    "y": [("υ", 0), ("γ", 1)],
+    "z": [("ζ", 0)],
+    "8": [("θ", 0)],
+    "3": [("ξ", 0)],
+    "th": [("θ", 0)],
+    "ps": [("ψ", 0)],
+    "ks": [("ξ", 0)],
+    "ch": [("χ", 0)],
+    "kh": [("χ", 0)],
+    "ou": [("ου", 0)],
+    "mp": [("μπ", 0)],
+    "nt": [("ντ", 0)],
+    "gk": [("γκ", 0)],
+    "gg": [("γγ", 0)],
+    "ts": [("τσ", 0)],
+    "tz": [("τζ", 0)],
+    "ai": [("αι", 0)],
+    "ei": [("ει", 0)],
+    "oi": [("οι", 0)],
+    "au": [("αυ", 0)],
+    "eu": [("ευ", 0)],
+    "af": [("αφ", 0), ("αυ", 1)],
+    "ef": [("εφ", 0), ("ευ", 1)],
+    "av": [("αβ", 0), ("αυ", 1)],
+    "ev": [("εβ", 0), ("ευ", 1)],
+}
+# fmt: on
+
+FINAL_SIGMA = re.compile(r"σ\b")
+
+
+class TrieNode:
+    __slots__ = "children", "outputs"
+
+    def __init__(self) -> None:
+        self.children: dict[str, TrieNode] = {}
+        self.outputs: list[tuple[str, int]] = []
+
+
+def build_trie(rules: dict[str, list[tuple[str, int]]]) -> TrieNode:
+    root = TrieNode()
+    for latin, outputs in rules.items():
+        node = root
+        for ch in latin:
+            node = node.children.setdefault(ch, TrieNode())
+        node.outputs.extend(outputs)
+    return root
+
+
+GREEKLISH_TRIE = build_trie(RULES)
+
+
+def greeklish_candidates(word: str, limit: int = 8, beam_width: int = 32) -> list[str]:
+    """
+    Return up to limit transliterations of word, the most likely first.
+    Characters with no rule (f.e. greek ones) are kept as they are.
+
+    >>> greeklish_candidates("xara", limit=2)
+    ['χαρα', 'ξαρα']
+    """
+    word = word.lower()
+    n = len(word)
+
+    # beams[i]: the partial transliterations of word[:i] with their cost.
+    beams: list[dict[str, int]] = [{} for _ in range(n + 1)]
+    beams[0][""] = 0
+
+    for i in range(n):
+        if not beams[i]:
+            continue
+
+        # Every rule starting at i, found in a single walk of the trie.
+        matches: list[tuple[int, str, int]] = []
+        node = GREEKLISH_TRIE
+        j = i
+        while j < n and (child := node.children.get(word[j])) is not None:
+            node = child
+            j += 1
+            matches.extend((j, greek, penalty) for greek, penalty in node.outputs)
+        if not matches:
+            matches.append((i + 1, word[i], 0))
+
+        best = heapq.nsmallest(beam_width, beams[i].items(), key=lambda item: (item[1], item[0]))
+        for prefix, cost in best:
+            for end, greek, penalty in matches:
+                candidate = prefix + greek
+                candidate_cost = cost + 1 + penalty
+                if candidate_cost < beams[end].get(candidate, candidate_cost + 1):
+                    beams[end][candidate] = candidate_cost
+
+    ranked = sorted(beams[n].items(), key=lambda item: (item[1], item[0]))
+    candidates: list[str] = []
+    for candidate, _ in ranked:
+        candidate = FINAL_SIGMA.sub("ς", candidate)
+        if candidate not in candidates:
+            candidates.append(candidate)
+        if len(candidates) == limit:
+            break
+
+    return candidates
+
+
+def transliterate(word: str, lexicon: Lexicon | None = None, limit: int = 32) -> str:
+    """Return the best candidate known to the lexicon, or the best candidate overall."""
+    candidates = greeklish_candidates(word, limit=limit)
+    if lexicon is not None:
+        for candidate in candidates:
+            if candidate in lexicon:
+                return candidate
+    return candidates[0] if candidates else word
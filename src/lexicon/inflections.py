@@ -0,0 +1,100 @@
+"""
+Offline index from inflected greek forms to their lemmas.
+
+Used to highlight the forms of a word in example sentences ("αγάπησε" for
+"αγαπώ") with a dictionary lookup, instead of guessing with fuzzy matching.
+The index is populated from the conjugation and declension tables parsed
+from Wiktionary, and persisted in SQLite so that it survives restarts.
+
+Example usage: get_inflections().lookup("αγάπησε") => {"αγαπω"}
+"""
+
+import sqlite3
+from collections import defaultdict
+from typing import Iterable
+
+from cache import DEFAULT_CACHE_PATH
+from wordref.longest import TOKEN, normalize_greek_word
+
+
+def inflection_key(form: str) -> str | None:
+    """
+    Return the normalized key of an inflected form, or None if it has no letters.
+    Periphrastic forms ("θα αγαπήσω", "έχω αγαπήσει") and forms with an
+    article ("του τραπεζιού") are keyed by their last word.
+
+    >>> inflection_key("θα αγαπήσω")
+    'αγαπησω'
+    """
+    tokens = [token for token in TOKEN.findall(form) if any(c.isalpha() for c in token)]
+    if not tokens:
+        return None
+    return normalize_greek_word(tokens[-1])
+
+
+class InflectionIndex:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH) -> None:
+        # Normalized form => normalized lemmas. A form can belong to several
+        # lemmas (f.e. "αγαπησε" is both from "αγαπώ" and "αγαπιέμαι").
+        self.lemmas: defaultdict[str, set[str]] = defaultdict(set)
+        # Bumped on every change, so that users can refresh what they derived from the index.
+        self.version = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS inflections (form TEXT, lemma TEXT, PRIMARY KEY (form, lemma))"
+        )
+        self.connection.commit()
+        for form, lemma in self.connection.execute("SELECT form, lemma FROM inflections"):
+            self.lemmas[form].add(lemma)
+
+    def learn(self, lemma: str, forms: Iterable[str]) -> int:
+        """
+        Add the inflected forms of lemma (as found in the tables, "/" separated
+        variants included) and persist them. Return the number of new forms.
+        """
+        lemma = normalize_greek_word(lemma)
+        new_rows: list[tuple[str, str]] = []
+        for cell in forms:
+            for form in cell.split("/"):
+                key = inflection_key(form)
+                if key is not None and lemma not in self.lemmas.get(key, ()):
+                    self.lemmas[key].add(lemma)
+                    new_rows.append((key, lemma))
+
+        if new_rows:
+            self.version += 1
+            self.connection.executemany("INSERT OR IGNORE INTO inflections VALUES (?, ?)", new_rows)
+            self.connection.commit()
+        return len(new_rows)
+
+    def lookup(self, word: str) -> set[str]:
+        """Return the normalized lemmas of word, empty if it is an unknown form."""
+        return self.lemmas.get(normalize_greek_word(word), set())
+
+    def __contains__(self, word: str) -> bool:
+        return normalize_greek_word(word) in self.lemmas
+
+    def __len__(self) -> int:
+        return len(self.lemmas)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+_inflections: InflectionIndex | None = None
+
+
+def configure_inflections(path: str = DEFAULT_CACHE_PATH) -> InflectionIndex:
+    global _inflections
+
+    if _inflections is not None:
+        _inflections.close()
+    _inflections = InflectionIndex(path)
+    return _inflections
+
+
+def get_inflections() -> InflectionIndex:
+    if _inflections is None:
+        return configure_inflections()
+    return _inflections
@@ -0,0 +1,100 @@
+"""
+Offline index from unaccented greek words to their accented headwords.
+
+Used by fix_greek_spelling to answer "χαρα" => "χαρά" without a request.
+The index is built from a bundled word list, plus every headword learned from
+a Wordref page (persisted in SQLite, so that it survives restarts).
+"""
+
+import sqlite3
+from collections import defaultdict
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from cache import DEFAULT_CACHE_PATH, PageCache
+from wordref.longest import normalize_greek_word
+
+WORDS_PATH = Path(__file__).parent / "words.txt"
+
+
+class Lexicon:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, words_path: Path = WORDS_PATH) -> None:
+        self.headwords: defaultdict[str, set[str]] = defaultdict(set)
+
+        with open(words_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    self.add(line)
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS headwords (headword TEXT PRIMARY KEY)")
+        self.connection.commit()
+        # Number of headwords learned from Wordref so far.
+        self.learned = 0
+        for (headword,) in self.connection.execute("SELECT headword FROM headwords"):
+            self.add(headword)
+            self.learned += 1
+
+    def add(self, headword: str) -> None:
+        self.headwords[normalize_greek_word(headword)].add(headword)
+
+    def learn(self, headword: str) -> None:
+        """Add a headword and persist it."""
+        if headword in self.headwords.get(normalize_greek_word(headword), ()):
+            return
+        self.add(headword)
+        self.learned += 1
+        self.connection.execute("INSERT OR IGNORE INTO headwords VALUES (?)", (headword,))
+        self.connection.commit()
+
+    def learn_from_page_cache(self, page_cache: PageCache) -> None:
+        """Learn the headwords of every greek Wordref page stored in the page cache."""
+        # Import here to avoid a circular import (utils uses the lexicon).
+        from utils import parse_headword
+
+        rows = page_cache.connection.execute(
+            "SELECT body FROM pages WHERE url LIKE 'https://www.wordreference.com/gren/%'"
+        )
+        for (body,) in rows:
+            headword = parse_headword(BeautifulSoup(body, "html.parser"))
+            if headword:
+                self.learn(headword.strip(","))
+
+    def lookup(self, word: str) -> str | None:
+        """
+        Return the accented headword of a greek word, or None if it is unknown
+        or ambiguous (f.e. "ποτε" can be both "πότε" and "ποτέ").
+        """
+        candidates = self.headwords.get(normalize_greek_word(word), ())
+        if len(candidates) != 1:
+            return None
+        return next(iter(candidates))
+
+    def __contains__(self, word: str) -> bool:
+        return normalize_greek_word(word) in self.headwords
+
+    def __len__(self) -> int:
+        return len(self.headwords)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+_lexicon: Lexicon | None = None
+
+
+def configure_lexicon(path: str = DEFAULT_CACHE_PATH) -> Lexicon:
+    global _lexicon
+
+    if _lexicon is not None:
+        _lexicon.close()
+    _lexicon = Lexicon(path)
+    return _lexicon
+
+
+def get_lexicon() -> Lexicon:
+    if _lexicon is None:
+        return configure_lexicon()
+    return _lexicon
@@ -0,0 +1,84 @@
+"""
+Least recently used in-memory cache bounded by the estimated size of its values.
+"""
+
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+def estimate_size(obj: Any) -> int:
+    """Approximate the memory footprint of obj, following the builtin containers."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += estimate_size(vars(obj))
+    return size
+
+
+class LRUCache:
+    """
+    Mapping that evicts its least recently used items once the estimated size
+    of the stored values exceeds max_bytes. Items put with a ttl (seconds)
+    expire after it.
+
+    >>> cache = LRUCache(max_bytes=1024)
+    >>> cache.put("a", "alpha")
+    >>> cache.get("a"), cache.get("b")
+    ('alpha', None)
+    >>> cache.hits, cache.misses
+    (1, 1)
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int] = estimate_size):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        # key -> (value, size, expiry time or None)
+        self.items: OrderedDict[Hashable, tuple[Any, int, float | None]] = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        item = self.items.get(key)
+        if item is not None and item[2] is not None and time.time() >= item[2]:
+            self.total_bytes -= self.items.pop(key)[1]
+            item = None
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.items.move_to_end(key)
+        return item[0]
+
+    def put(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        if key in self.items:
+            self.total_bytes -= self.items.pop(key)[1]
+        expires_at = time.time() + ttl if ttl is not None else None
+        self.items[key] = (value, size, expires_at)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self.items.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def clear(self) -> None:
+        self.items.clear()
+        self.total_bytes = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.items
+
+    def __len__(self) -> int:
+        return len(self.items)
@@ -0,0 +1,205 @@
+"""
+In-process metrics of the bot: counters, gauges and latency histograms.
+
+They are served in the Prometheus text format on a local HTTP endpoint
+(cf. start_metrics_server), along with the lag of the event loop.
+
+Example usage:
+    get_metrics().increment("commands", command="conj", outcome="ok")
+    get_metrics().observe("command_seconds", 1.2, command="conj")
+    with get_metrics().timer("stage_seconds", stage="wordref.parse_entry"):
+        ...
+    get_metrics().quantile("command_seconds", 0.95, command="conj")
+"""
+
+import asyncio
+import bisect
+import contextlib
+import functools
+import time
+from collections import Counter, defaultdict, deque
+from typing import Callable, Iterator, TypeVar
+
+from aiohttp import web
+
+from tracing import span
+
+T = TypeVar("T")
+
+PREFIX = "rbot_"
+
+# Latency samples kept per series, for the quantiles.
+MAX_SAMPLES = 1024
+
+# Upper bounds (seconds) of the buckets of the histograms.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+DEFAULT_METRICS_HOST = "127.0.0.1"
+DEFAULT_METRICS_PORT = 9108
+LOOP_LAG_INTERVAL = 0.5
+
+# A series is a metric name and its labels, f.e. ("commands", (("command", "conj"),)).
+Series = tuple[str, tuple[tuple[str, str], ...]]
+
+
+def series(name: str, labels: dict[str, str]) -> Series:
+    return name, tuple(sorted(labels.items()))
+
+
+class Histogram:
+    __slots__ = "counts", "sum", "count"
+
+    def __init__(self) -> None:
+        # Non cumulative: counts[i] is the number of values in (BUCKETS[i - 1], BUCKETS[i]].
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: tuple[tuple[str, str], ...], **extra: str) -> str:
+    items = [*labels, *extra.items()]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{escape(str(value))}"' for key, value in items) + "}"
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.counters: Counter[Series] = Counter()
+        self.gauges: dict[Series, float] = {}
+        self.histograms: defaultdict[Series, Histogram] = defaultdict(Histogram)
+        self.samples: defaultdict[Series, deque[float]] = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+    def increment(self, name: str, amount: int = 1, **labels: str) -> None:
+        self.counters[series(name, labels)] += amount
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        self.gauges[series(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = series(name, labels)
+        self.histograms[key].observe(value)
+        self.samples[key].append(value)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Observe the duration of the block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def count(self, name: str, **labels: str) -> int:
+        return self.counters[series(name, labels)]
+
+    def gauge(self, name: str, **labels: str) -> float:
+        return self.gauges.get(series(name, labels), 0.0)
+
+    def quantile(self, name: str, q: float, **labels: str) -> float | None:
+        """Return the q-quantile of the last samples of a series, or None without samples."""
+        samples = self.samples.get(series(name, labels))
+        if not samples:
+            return None
+        # Linear interpolation between the closest ranks: q=0 is the min, q=1 the max.
+        ordered = sorted(samples)
+        position = min(max(q, 0.0), 1.0) * (len(ordered) - 1)
+        low = int(position)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text format."""
+        lines: list[str] = []
+
+        def by_name(keys: Iterator[Series]) -> dict[str, list[Series]]:
+            grouped: defaultdict[str, list[Series]] = defaultdict(list)
+            for key in sorted(keys):
+                grouped[key[0]].append(key)
+            return grouped
+
+        for name, keys in by_name(iter(self.counters)).items():
+            lines.append(f"# TYPE {PREFIX}{name}_total counter")
+            for key in keys:
+                lines.append(f"{PREFIX}{name}_total{format_labels(key[1])} {self.counters[key]}")
+
+        for name, keys in by_name(iter(self.gauges)).items():
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            for key in keys:
+                lines.append(f"{PREFIX}{name}{format_labels(key[1])} {self.gauges[key]}")
+
+        for name, keys in by_name(iter(self.histograms)).items():
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for key in keys:
+                histogram = self.histograms[key]
+                cumulative = 0
+                for bound, count in zip([*BUCKETS, "+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f"{PREFIX}{name}_bucket{format_labels(key[1], le=str(bound))} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{format_labels(key[1])} {histogram.sum}")
+                lines.append(f"{PREFIX}{name}_count{format_labels(key[1])} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    return _metrics
+
+
+def timed(stage: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """
+    Decorate a (synchronous) pipeline stage to observe its duration as stage_seconds,
+    and trace it as a span (cf. tracing.py).
+    """
+
+    def decorator(function: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs) -> T:
+            with span(stage), get_metrics().timer("stage_seconds", stage=stage):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+async def monitor_loop_lag(interval: float = LOOP_LAG_INTERVAL) -> None:
+    """
+    Measure how late the event loop wakes up a sleeping task, forever.
+    A high lag means that something blocks the loop (f.e. parsing a big page).
+    """
+    metrics = get_metrics()
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - start - interval)
+        metrics.observe("event_loop_lag_seconds", lag)
+        metrics.set("event_loop_lag_last_seconds", lag)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=get_metrics().render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(
+    host: str = DEFAULT_METRICS_HOST, port: int = DEFAULT_METRICS_PORT
+) -> web.AppRunner:
+    """Serve the metrics on http://host:port/metrics, in the running event loop."""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
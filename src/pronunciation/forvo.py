@@ -1,19 +1,19 @@
 # From: https://github.com/realmayus/anki_forvo_dl/blob/main/src/Forvo.py
 
+import asyncio
 import base64
 import io
 import random
 import re
-import time
 import urllib.parse
-import urllib.request
 from dataclasses import dataclass
 from typing import List, Union
-from urllib.error import HTTPError
 
-import requests
 from bs4 import BeautifulSoup
 
+from cache import UpstreamError, fetch_page
+from metrics import get_metrics, timed
+from singleflight import coalesce, normalize_word
 from utils import NotFoundException
 
 search_url = "https://forvo.com/word/"
@@ -61,43 +61,36 @@ class Forvo:
         self.word = word
         self.pronunciations: List[Pronunciation] = []
 
-        # Set a user agent so that Forvo/CloudFlare lets us access the page
-        opener = urllib.request.build_opener()
-
-        opener.addheaders = HEADERS
-        urllib.request.install_opener(opener)
-
-    def load_search_query(self):
+    async def load_search_query(self):
         """Retries only in case of 403: Forbidden."""
-        for _ in range(3):
+        attempts = 3
+        for attempt in range(attempts):
             try:
-                self._load_search_query()
-            except HTTPError as e:
-                if e.code != 403:
+                await self._load_search_query()
+                return
+            except UpstreamError as e:
+                if e.status != 403 or attempt == attempts - 1:
                     raise e
-                time.sleep(0.5)
+                get_metrics().increment("retries", kind="forvo_403")
+                await asyncio.sleep(0.5)
 
-    def _load_search_query(self):
+    async def _load_search_query(self):
         """Loads the search result page on Forvo"""
-        try:
-            log_debug("[Forvo.py] Reading result page")
-            page = urllib.request.urlopen(url=search_url + urllib.parse.quote_plus(self.word)).read()
-            log_debug("[Forvo.py] Done with reading result page")
-
-            log_debug("[Forvo.py] Initializing BS4")
-            self.html = BeautifulSoup(page, "html.parser")
-            log_debug("[Forvo.py] Initialized BS4")
-        except HTTPError as e:
-            log_debug(f"[Forvo.py] HTTPError: {e}")
-            if e.code == 404:
-                raise NotFoundException()
-            else:
-                # Sometimes we can get 403: Forbidden
-                raise e
-        except Exception as e:
-            log_debug("[Forvo.py] Exception: " + str(e))
-            raise e
+        log_debug("[Forvo.py] Reading result page")
+        # Set a user agent so that Forvo/CloudFlare lets us access the page
+        page = await fetch_page(search_url + urllib.parse.quote_plus(self.word), headers=dict(HEADERS))
+        log_debug("[Forvo.py] Done with reading result page")
 
+        if page.status == 404:
+            raise NotFoundException()
+        # Sometimes we can get 403: Forbidden
+        page.raise_for_status()
+
+        log_debug("[Forvo.py] Initializing BS4")
+        self.html = BeautifulSoup(page.body, "html.parser")
+        log_debug("[Forvo.py] Initialized BS4")
+
+    @timed("forvo.get_pronunciations")
     def get_pronunciations(self):
         """Creates pronunciation objects from the soup"""
         log_debug("[Forvo.py] Searching language containers")
@@ -197,15 +190,20 @@ class Forvo:
         return self
 
 
-def get_forvo_pronunciation_audio(word: str) -> io.BytesIO:
+async def get_forvo_pronunciation_audio(word: str) -> io.BytesIO:
     """Can raise if 404: NotFound, or 403: Forbidden"""
+    # Every caller gets its own file object: they are read (and closed) separately.
+    return io.BytesIO(await fetch_forvo_pronunciation_audio(word))
+
+
+@coalesce("forvo", key=normalize_word)
+async def fetch_forvo_pronunciation_audio(word: str) -> bytes:
     f = Forvo(word, "el")
-    f.load_search_query()
+    await f.load_search_query()
     f.get_pronunciations()
 
     # pronunciation = f.pronunciations[0]
     pronunciation = random.choice(f.pronunciations)
-    response = requests.get(pronunciation.download_url, headers=dict(HEADERS))
-    audio_file = io.BytesIO(response.content)
+    page = await fetch_page(pronunciation.download_url, headers=dict(HEADERS))
 
-    return audio_file
+    return page.body
@@ -0,0 +1,195 @@
+"""
+Per-host rate limiting of the outbound requests, with priorities.
+
+Every request that goes to the network (cf. cache.fetch_page) first takes a
+token from the bucket of its host. A bucket holds up to `burst` tokens and
+refills at `rate` tokens per second, so that a busy bot paces its traffic
+instead of getting 403s from Forvo or being throttled by Wordref.
+
+When a bucket is empty, the requests wait in a priority queue: the commands
+of the users (INTERACTIVE) are served before the background work (f.e. the
+prefetching of random entries, BACKGROUND), and in arrival order otherwise.
+The priority of the current task is set with set_priority.
+
+The depth of the queues and the waits are exported in metrics.py.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Mapping
+from urllib.parse import urlsplit
+
+from metrics import get_metrics
+from tracing import event
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("priority", default=INTERACTIVE)
+
+
+@dataclass(frozen=True)
+class Rate:
+    # Tokens per second, and size of the bucket.
+    rate: float
+    burst: int
+
+
+DEFAULT_RATE = Rate(5.0, 10)
+HOST_RATES = {
+    "www.wordreference.com": Rate(2.0, 5),
+    "forvo.com": Rate(1.0, 3),
+    "audio00.forvo.com": Rate(4.0, 8),
+    "el.wiktionary.org": Rate(10.0, 20),
+    "en.wiktionary.org": Rate(10.0, 20),
+}
+# Local servers (f.e. the ones of the tests) are not limited.
+UNLIMITED_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+
+def set_priority(priority: int) -> None:
+    """Set the priority of the requests of the current task (and of the tasks it creates)."""
+    _priority.set(priority)
+
+
+def get_priority() -> int:
+    return _priority.get()
+
+
+def rates_from_config(config: Mapping[str, str | None]) -> dict[str, Rate]:
+    """
+    Return the host rates, overridden by RATE_LIMITS in .env (host=rate/burst, comma separated).
+
+    >>> rates_from_config({"RATE_LIMITS": "forvo.com=0.5/2"})["forvo.com"]
+    Rate(rate=0.5, burst=2)
+    """
+    rates = dict(HOST_RATES)
+    for item in (config.get("RATE_LIMITS") or "").split(","):
+        if not item.strip():
+            continue
+        host, limit = item.split("=")
+        rate, burst = limit.split("/")
+        rates[host.strip().lower()] = Rate(float(rate), int(burst))
+    return rates
+
+
+class TokenBucket:
+    def __init__(self, host: str, rate: Rate) -> None:
+        self.host = host
+        self.rate = rate.rate
+        self.burst = rate.burst
+        self.tokens = float(rate.burst)
+        self.updated = time.monotonic()
+
+        # (priority, arrival, future) of the requests waiting for a token.
+        self.waiters: list[tuple[int, int, asyncio.Future]] = []
+        self.arrivals = itertools.count()
+        self.dispatcher: asyncio.Task | None = None
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, priority: int) -> None:
+        self.refill()
+        if not self.waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (priority, next(self.arrivals), future)
+        heapq.heappush(self.waiters, waiter)
+        self.update_depth()
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self.dispatch())
+        try:
+            await future
+        except asyncio.CancelledError:
+            self.cancel(waiter)
+            raise
+
+    def cancel(self, waiter: tuple[int, int, asyncio.Future]) -> None:
+        """Forget a waiter that was cancelled, so that it is neither counted nor waited for."""
+        _, _, future = waiter
+        if waiter in self.waiters:
+            self.waiters.remove(waiter)
+            heapq.heapify(self.waiters)
+            self.update_depth()
+        elif future.done() and not future.cancelled():
+            # Cancelled after the token was handed out: give it back.
+            self.tokens = min(self.burst, self.tokens + 1)
+        if not self.waiters and self.dispatcher is not None and not self.dispatcher.done():
+            self.dispatcher.cancel()
+
+    async def dispatch(self) -> None:
+        """Hand out the tokens to the waiters, in priority order, as they refill."""
+        while self.waiters:
+            self.refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self.waiters)
+            self.update_depth()
+            # Cancelled, but its task has not run yet: the token goes to the next one.
+            if not future.done():
+                self.tokens -= 1
+                future.set_result(None)
+
+    def update_depth(self) -> None:
+        get_metrics().set("ratelimit_queue_depth", len(self.waiters), host=self.host)
+
+
+class RateLimiter:
+    def __init__(self, rates: dict[str, Rate] | None = None, default_rate: Rate = DEFAULT_RATE) -> None:
+        self.rates = HOST_RATES if rates is None else rates
+        self.default_rate = default_rate
+        self.buckets: dict[str, TokenBucket] = {}
+        # The waiters and dispatchers are bound to an event loop (cf. session.SessionManager).
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+    def bucket(self, host: str) -> TokenBucket:
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.buckets = {}
+            self.loop = loop
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(host, self.rates.get(host, self.default_rate))
+        return self.buckets[host]
+
+    async def acquire(self, url: str) -> None:
+        """Wait until a request to url is allowed."""
+        host = (urlsplit(url).hostname or "").lower()
+        if host in UNLIMITED_HOSTS:
+            return
+
+        priority = get_priority()
+        start = time.perf_counter()
+        await self.bucket(host).acquire(priority)
+        wait = time.perf_counter() - start
+        get_metrics().observe("ratelimit_wait_seconds", wait, host=host, priority=PRIORITY_NAMES[priority])
+        if wait > 0.001:
+            event("ratelimit.waited", host=host, wait=wait)
+
+
+_rate_limiter: RateLimiter | None = None
+
+
+def configure_rate_limiter(
+    rates: dict[str, Rate] | None = None, default_rate: Rate = DEFAULT_RATE
+) -> RateLimiter:
+    global _rate_limiter
+
+    _rate_limiter = RateLimiter(rates, default_rate)
+    return _rate_limiter
+
+
+def get_rate_limiter() -> RateLimiter:
+    if _rate_limiter is None:
+        return configure_rate_limiter()
+    return _rate_limiter
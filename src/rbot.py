@@ -1,20 +1,54 @@
+import asyncio
+from typing import Awaitable, Callable
+
 import discord
+from aiohttp import web
 from discord import app_commands
 from dotenv import dotenv_values
 
 import pronunciation.pronunciation as pronunciation
+from cache import DEFAULT_CACHE_PATH, configure_page_cache
 from gr_datetime.gr_date import get_full_date
 from help.help import HelpMessage
+from lexicon.inflections import configure_inflections
+from lexicon.lexicon import configure_lexicon
+from metrics import DEFAULT_METRICS_PORT, get_metrics, monitor_loop_lag, start_metrics_server
+from ratelimit import configure_rate_limiter, rates_from_config
+from session import close_session, open_sessions
+from tracing import DEFAULT_SAMPLE_RATE, DEFAULT_TRACE_PATH, configure_tracing, span
 from utils import NotFoundException, Pagination, fix_greek_spelling
 from wiktionary.embed_message import embed_message as wiktionary_message
-from wiktionary.wiktionary import fetch_conjugation
-from wordref.wordref import Wordref
+from wiktionary.parse_api import configure_parse_api
+from wiktionary.wiktionary import fetch_conjugation, index_page_cache
+from wordref.prefetch import RandomEntryPool
+from wordref.wordref import fetch_embed_fixing_spelling
+from worker import DEFAULT_WORKERS, budgets_from_config, configure_worker_pool, get_worker_pool
+
+# Validated random entries for /wotdgr and /wotden, keyed by gr_en.
+random_pools = {
+    True: RandomEntryPool(gr_en=True, hide_words=True, min_sentences_shown=1, max_sentences_shown=3),
+    False: RandomEntryPool(gr_en=False, hide_words=True, min_sentences_shown=1, max_sentences_shown=3),
+}
 
 
 class MyClient(discord.Client):
     def __init__(self, _intents: discord.Intents) -> None:
         super().__init__(intents=_intents)
         self.synced = False
+        self.background_tasks: list[asyncio.Task] = []
+        # Local port of the metrics endpoint (cf. metrics.py), None to disable it.
+        self.metrics_port: int | None = DEFAULT_METRICS_PORT
+        self.metrics_runner: web.AppRunner | None = None
+
+    async def setup_hook(self) -> None:
+        await open_sessions()
+        for pool in random_pools.values():
+            self.background_tasks.append(asyncio.create_task(pool.run()))
+        self.background_tasks.extend(get_worker_pool().start())
+        self.background_tasks.append(asyncio.create_task(monitor_loop_lag()))
+        if self.metrics_port is not None:
+            self.metrics_runner = await start_metrics_server(port=self.metrics_port)
+            print(f"\033[32mMetrics on http://127.0.0.1:{self.metrics_port}/metrics\033[0m")
 
     async def on_ready(self) -> None:
         await self.wait_until_ready()
@@ -23,6 +57,14 @@ class MyClient(discord.Client):
             self.synced = True
         print(f"\033[32mBot is ready! {self.user}\033[0m")
 
+    async def close(self) -> None:
+        for task in self.background_tasks:
+            task.cancel()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        await close_session()
+        await super().close()
+
     async def on_message(self, message: discord.Message) -> None:
         if message.author == self.user:
             return
@@ -34,29 +76,43 @@ client = MyClient(intents)
 tree = app_commands.CommandTree(client)
 
 
+async def defer_to_workers(
+    interaction: discord.Interaction,
+    command: str,
+    work: Callable[[], Awaitable[None]],
+    ephemeral: bool = False,
+) -> None:
+    """
+    Acknowledge the interaction right away, and run work in the worker pool.
+    work must answer with interaction.followup (cf. worker.py).
+    """
+    await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+
+    async def on_failure(message: str) -> None:
+        await interaction.followup.send(message, ephemeral=ephemeral)
+
+    await get_worker_pool().submit(command, work, on_failure)
+
+
 async def template_command(
     interaction: discord.Interaction,
-    word: str | None,
+    word: str,
     gr_en: bool,
     hide_words: bool,
     min_sentences_shown: int,
     max_sentences_shown: int,
 ):
-    wordref = Wordref(word, gr_en, hide_words, min_sentences_shown, max_sentences_shown)
-    wordref_embed = wordref.fetch_embed()
-
-    # In case of failure, try again once with fixed spelling.
-    if wordref_embed is None and word is not None:
-        original_word = word
-        word = fix_greek_spelling(word)
-        print(f"Converted {original_word=} to {word=}")
-        wordref = Wordref(word, gr_en, hide_words, min_sentences_shown, max_sentences_shown)
-        wordref_embed = wordref.fetch_embed()
-
-    if wordref_embed is None:
-        await interaction.response.send_message("The command did not succeed.")
-    else:
-        await interaction.response.send_message(embed=wordref_embed)
+    async def work() -> None:
+        wordref_embed = await fetch_embed_fixing_spelling(
+            word, gr_en, hide_words, min_sentences_shown, max_sentences_shown
+        )
+
+        if wordref_embed is None:
+            await interaction.followup.send("The command did not succeed.")
+        else:
+            await interaction.followup.send(embed=wordref_embed)
+
+    await defer_to_workers(interaction, "search", work)
     # try:
     #     wordref = Wordref(word, gr_en, hide_words, amount_sentences_shown)
     #     wordref_embed = wordref.embed()
@@ -65,6 +121,25 @@ async def template_command(
     #     await interaction.response.send_message(content=f"Error: {e}")
 
 
+async def random_command(interaction: discord.Interaction, gr_en: bool):
+    pool = random_pools[gr_en]
+    with span("command", command="wotd"), get_metrics().timer("command_seconds", command="wotd"):
+        wordref_embed = pool.take()
+        if wordref_embed is not None:
+            await interaction.response.send_message(embed=wordref_embed)
+            return
+
+    # Empty pool (f.e. right after startup): the live fetch may take several random pages.
+    async def work() -> None:
+        wordref_embed = await pool.fetch_live()
+        if wordref_embed is None:
+            await interaction.followup.send("The command did not succeed.")
+        else:
+            await interaction.followup.send(embed=wordref_embed)
+
+    await defer_to_workers(interaction, "wotd", work)
+
+
 # helper function for wiktionary stuff
 async def wiktionary_handler(
     interaction: discord.Interaction,
@@ -73,13 +148,14 @@ async def wiktionary_handler(
     ephemeral: str = "True",
 ):
     ephemeral = ephemeral.lower() in ["true", "yes", "1"]
-    embeds = await wiktionary_message(word, language)
 
-    await interaction.response.send_message(embed=embeds[0], ephemeral=ephemeral)
-    if len(embeds) > 1:
-        for embed in embeds[1:]:
+    async def work() -> None:
+        embeds = await wiktionary_message(word, language)
+        for embed in embeds:
             await interaction.followup.send(embed=embed, ephemeral=ephemeral)
 
+    await defer_to_workers(interaction, "wiktionary", work, ephemeral=ephemeral)
+
 
 @tree.command(name="wiktionary", description="Return the Wiktionary entry for a word")
 async def wiktionary(
@@ -101,12 +177,12 @@ async def wiktionarygr(
 
 @tree.command(name="wotdgr", description="Prompts a random Greek word from Wordref")
 async def wotdgr(interaction: discord.Interaction):
-    await template_command(interaction, None, True, True, 1, 3)
+    await random_command(interaction, gr_en=True)
 
 
 @tree.command(name="wotden", description="Prompts a random english word from Wordref")
 async def wotden(interaction: discord.Interaction):
-    await template_command(interaction, None, False, True, 1, 3)
+    await random_command(interaction, gr_en=False)
 
 
 @tree.command(name="searchgr", description="Searches the given Greek word in Wordref (supports greeklish)")
@@ -135,31 +211,39 @@ async def forvo(interaction: discord.Interaction, word: str):
     # We do not always want to fix the greek spelling because valid words may be
     # modified by the query to `fix_greek_spelling`: ταξίδια => ταξίδι.
 
-    try:
-        message, audio_file = pronunciation.get_pronunciation(word)
-    except NotFoundException:
-        # In case of failure, try again once with fixed spelling.
-        word = fix_greek_spelling(word)
+    async def work() -> None:
+        nonlocal word
         try:
-            message, audio_file = pronunciation.get_pronunciation(word)
+            message, audio_file = await pronunciation.get_pronunciation(word)
         except NotFoundException:
-            await interaction.response.send_message(f"Could not find the word {word}!")
-            return
+            # In case of failure, try again once with fixed spelling.
+            word = await fix_greek_spelling(word)
+            try:
+                message, audio_file = await pronunciation.get_pronunciation(word)
+            except NotFoundException:
+                await interaction.followup.send(f"Could not find the word {word}!")
+                return
+
+        file = discord.File(audio_file, filename=f"{word}.mp3")
+        await interaction.followup.send(file=file, content=message)
 
-    file = discord.File(audio_file, filename=f"{word}.mp3")
-    await interaction.response.send_message(file=file, content=message)
+    await defer_to_workers(interaction, "forvo", work)
 
 
 @tree.command(name="conj", description="Returns the present tense of the verb.")
 async def conj(interaction: discord.Interaction, word: str):
+    await defer_to_workers(interaction, "conj", lambda: conj_work(interaction, word))
+
+
+async def conj_work(interaction: discord.Interaction, word: str):
     conjugation = await fetch_conjugation(word)
     if not conjugation:
         prev_word = word
-        word = fix_greek_spelling(word)
+        word = await fix_greek_spelling(word)
         if prev_word != word:
             conjugation = await fetch_conjugation(word)
     if not conjugation:
-        await interaction.response.send_message(f"Could not find conjugation for {word}.")
+        await interaction.followup.send(f"Could not find conjugation for {word}.")
         return
 
     url = f"https://el.wiktionary.org/wiki/{word}"
@@ -179,6 +263,29 @@ async def conj(interaction: discord.Interaction, word: str):
 
 def main() -> None:
     config = dotenv_values(".env")
+    cache_path = config.get("CACHE_PATH", DEFAULT_CACHE_PATH)
+    page_cache = configure_page_cache(cache_path)
+    lexicon = configure_lexicon(cache_path)
+    # First start with a lexicon: learn from the pages cached so far.
+    if lexicon.learned == 0:
+        lexicon.learn_from_page_cache(page_cache)
+    inflections = configure_inflections(cache_path)
+    if len(inflections) == 0:
+        index_page_cache(page_cache)
+    configure_rate_limiter(rates_from_config(config))
+    # TRACE_PATH="" disables the export of the traces.
+    configure_tracing(
+        config.get("TRACE_PATH", DEFAULT_TRACE_PATH) or None,
+        float(config.get("TRACE_SAMPLE_RATE") or DEFAULT_SAMPLE_RATE),
+    )
+    # WIKTIONARY_BACKEND=api fetches only the needed sections of the Wiktionary pages.
+    if config.get("WIKTIONARY_BACKEND") == "api":
+        configure_parse_api()
+    # METRICS_PORT="" disables the metrics endpoint.
+    metrics_port = config.get("METRICS_PORT", str(DEFAULT_METRICS_PORT))
+    client.metrics_port = int(metrics_port) if metrics_port else None
+    default_budget, budgets = budgets_from_config(config)
+    configure_worker_pool(int(config.get("WORKERS") or DEFAULT_WORKERS), default_budget, budgets)
     client.run(config["TOKEN"])
 
 
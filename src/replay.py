@@ -0,0 +1,144 @@
+"""
+Record / replay of the upstream pages, for offline and deterministic tests.
+
+A cassette is a JSON file mapping URLs to recorded responses (status and body
+file, relative to the cassette). In record mode, every page fetched from the
+real upstreams is added to it. In replay mode, a local aiohttp stub server
+serves the cassette and every request is routed to it, so that the whole HTTP
+path (session, page cache, status handling) runs without network.
+
+Every call site fetches through cache.fetch_page, so this is the only hook.
+
+Example usage:
+    server = StubServer(Cassette("tests/cassettes/upstream.json"))
+    server.start()
+    configure_upstream(upstream_url=server.upstream_url)
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import quote, urlsplit, urlunsplit
+
+from aiohttp import web
+
+from cache import Page, normalize_url
+
+LOOPBACK_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+
+def is_loopback(url: str) -> bool:
+    """Local servers (f.e. the ones of the tests) are neither recorded nor replayed."""
+    return urlsplit(url).hostname in LOOPBACK_HOSTS
+
+
+@dataclass
+class Recording:
+    url: str
+    status: int
+    # Relative to the cassette, None for an empty body.
+    body: str | None
+
+
+class Cassette:
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.recordings: dict[str, Recording] = {}
+        if self.path.exists():
+            for recording in json.loads(self.path.read_text(encoding="utf-8")):
+                self.recordings[normalize_url(recording["url"])] = Recording(**recording)
+
+    def get(self, url: str) -> tuple[int, bytes] | None:
+        """Return the recorded (status, body) of url, or None if it was never recorded."""
+        recording = self.recordings.get(normalize_url(url))
+        if recording is None:
+            return None
+        body = (self.path.parent / recording.body).read_bytes() if recording.body else b""
+        return recording.status, body
+
+    def record(self, page: Page) -> None:
+        """Add a page fetched from upstream. Meant to be used as the on_response hook of fetch_page."""
+        if is_loopback(page.url):
+            return
+        key = normalize_url(page.url)
+        body = None
+        if page.body:
+            body = f"bodies/{hashlib.sha1(key.encode()).hexdigest()[:16]}"
+            (self.path.parent / body).parent.mkdir(parents=True, exist_ok=True)
+            (self.path.parent / body).write_bytes(page.body)
+        self.recordings[key] = Recording(page.url, page.status, body)
+
+    def save(self) -> None:
+        recordings = sorted(self.recordings.values(), key=lambda recording: recording.url)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(
+            json.dumps([vars(recording) for recording in recordings], indent=2, ensure_ascii=False) + "\n",
+            encoding="utf-8",
+        )
+
+    def __len__(self) -> int:
+        return len(self.recordings)
+
+
+class StubServer:
+    """
+    Local aiohttp server replaying a cassette.
+
+    It runs its own event loop in a background thread, so that it can be shared
+    by the (synchronous or asynchronous) tests, whatever their event loop is.
+    Upstream URLs are mapped to http://127.0.0.1:<port>/<host>/<path>.
+    """
+
+    def __init__(self, cassette: Cassette) -> None:
+        self.cassette = cassette
+        # Requested URLs that are not in the cassette.
+        self.misses: list[str] = []
+        self.base_url = ""
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="stub-server", daemon=True)
+        self.runner: web.AppRunner | None = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        path = quote(request.match_info["path"])
+        url = urlunsplit(("https", request.match_info["host"], f"/{path}", request.query_string, ""))
+        recorded = self.cassette.get(url)
+        if recorded is None:
+            self.misses.append(url)
+            return web.Response(status=404, text=f"Not in the cassette: {url}")
+        status, body = recorded
+        return web.Response(status=status, body=body)
+
+    async def _start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/{host}/{path:.*}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+
+    def start(self) -> str:
+        """Start serving, and return the base URL of the server."""
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+        return self.base_url
+
+    def stop(self) -> None:
+        if self.runner is not None:
+            asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def upstream_url(self, url: str) -> str:
+        """Map an upstream URL to the stub server. Meant to be used as the upstream_url hook of fetch_page."""
+        if is_loopback(url):
+            return url
+        parts = urlsplit(url)
+        return urlunsplit(
+            ("http", self.base_url.removeprefix("http://"), f"/{parts.netloc}{parts.path}", parts.query, "")
+        )
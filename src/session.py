@@ -0,0 +1,160 @@
+"""
+Pooled aiohttp sessions for the outbound requests of the bot.
+
+Opening a ClientSession per request throws away the connection pool, so every
+lookup pays for DNS, TCP and TLS again. Instead, every coroutine that talks to
+an upstream borrows a long-lived session through `get_session(url)`.
+
+Every upstream host gets its own session, hence its own connector: a busy host
+(f.e. Forvo audio downloads) can not starve the connections of the others, and
+each pool is sized for its host. Idle connections are kept alive between the
+lookups. Responses are compressed on the wire (gzip, and brotli if installed).
+
+The sessions are opened with the bot (MyClient.setup_hook) and closed with it.
+The use of each pool is exported in metrics.py.
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, TraceConfig
+
+from metrics import get_metrics
+from tracing import event
+
+try:
+    # aiohttp decodes brotli responses only if one of these is installed.
+    import brotli  # noqa: F401
+
+    HAS_BROTLI = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+
+        HAS_BROTLI = True
+    except ImportError:
+        HAS_BROTLI = False
+
+ACCEPT_ENCODING = "gzip, deflate, br" if HAS_BROTLI else "gzip, deflate"
+
+# Connections per upstream host.
+DEFAULT_CONNECTION_LIMIT = 8
+HOST_CONNECTION_LIMITS = {
+    "www.wordreference.com": 8,
+    "el.wiktionary.org": 8,
+    "en.wiktionary.org": 8,
+    "forvo.com": 4,
+    "audio00.forvo.com": 4,
+}
+# Seconds an idle connection is kept open for the next request.
+KEEPALIVE_TIMEOUT = 60
+REQUEST_TIMEOUT = ClientTimeout(total=15)
+
+
+def pool_trace_config(host: str) -> TraceConfig:
+    """Report the use of the pool of host: requests in flight, new and reused connections, waits."""
+    metrics = get_metrics()
+    in_flight = 0
+    trace_config = TraceConfig()
+
+    async def on_request_start(session, context: SimpleNamespace, params) -> None:
+        nonlocal in_flight
+        in_flight += 1
+        metrics.set("pool_requests_in_flight", in_flight, host=host)
+
+    async def on_request_done(session, context: SimpleNamespace, params) -> None:
+        nonlocal in_flight
+        in_flight -= 1
+        metrics.set("pool_requests_in_flight", in_flight, host=host)
+
+    async def on_connection_queued_start(session, context: SimpleNamespace, params) -> None:
+        context.queued = time.perf_counter()
+
+    async def on_connection_queued_end(session, context: SimpleNamespace, params) -> None:
+        metrics.observe("pool_wait_seconds", time.perf_counter() - context.queued, host=host)
+
+    async def on_connection_create_end(session, context: SimpleNamespace, params) -> None:
+        metrics.increment("pool_connections", host=host, result="new")
+
+    async def on_connection_reuseconn(session, context: SimpleNamespace, params) -> None:
+        metrics.increment("pool_connections", host=host, result="reused")
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_done)
+    trace_config.on_request_exception.append(on_request_done)
+    trace_config.on_connection_queued_start.append(on_connection_queued_start)
+    trace_config.on_connection_queued_end.append(on_connection_queued_end)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    return trace_config
+
+
+async def close_sessions(sessions: list[ClientSession]) -> None:
+    results = await asyncio.gather(
+        *(session.close() for session in sessions if not session.closed), return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            event("session.close_failed", error=repr(result))
+
+
+class SessionManager:
+    def __init__(self) -> None:
+        self.sessions: dict[str, ClientSession] = {}
+        # A session is bound to the event loop it was created in.
+        self.loop: asyncio.AbstractEventLoop | None = None
+        # Closing of the sessions of a previous loop.
+        self.closing: set[asyncio.Task] = set()
+
+    def get(self, host: str) -> ClientSession:
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # The sessions of a previous loop (f.e. of another test) can not be used here:
+            # close them (and their connectors) in this one, in the background.
+            if self.sessions:
+                task = loop.create_task(close_sessions(list(self.sessions.values())))
+                self.closing.add(task)
+                task.add_done_callback(self.closing.discard)
+            self.sessions = {}
+            self.loop = loop
+
+        session = self.sessions.get(host)
+        if session is None or session.closed:
+            limit = HOST_CONNECTION_LIMITS.get(host, DEFAULT_CONNECTION_LIMIT)
+            metrics = get_metrics()
+            metrics.set("pool_connection_limit", limit, host=host)
+            connector = TCPConnector(limit=limit, keepalive_timeout=KEEPALIVE_TIMEOUT, ttl_dns_cache=300)
+            session = ClientSession(
+                connector=connector,
+                timeout=REQUEST_TIMEOUT,
+                headers={"Accept-Encoding": ACCEPT_ENCODING},
+                trace_configs=[pool_trace_config(host)],
+            )
+            self.sessions[host] = session
+        return session
+
+    async def close(self) -> None:
+        sessions, self.sessions = self.sessions, {}
+        await close_sessions(list(sessions.values()))
+        await asyncio.gather(*self.closing, return_exceptions=True)
+        self.loop = None
+
+
+_sessions = SessionManager()
+
+
+def get_session(url: str = "") -> ClientSession:
+    """Return the shared session of the host of url, creating it lazily."""
+    return _sessions.get(urlsplit(url).netloc.lower())
+
+
+async def open_sessions() -> None:
+    """Open the sessions of the known upstreams, so that the first lookups find them ready."""
+    for host in HOST_CONNECTION_LIMITS:
+        _sessions.get(host)
+
+
+async def close_session() -> None:
+    await _sessions.close()
@@ -0,0 +1,80 @@
+"""
+Coalescing of identical concurrent lookups.
+
+When a word is discussed in a channel, several users often look it up within
+seconds. Instead of fetching and parsing the same pages once per user, the
+first call does the work, and the identical calls arriving while it is in
+flight await its result. Nothing is kept once the call is done: caching is
+the job of the page and entry caches.
+
+The number of calls saved is counted per group in metrics.py.
+
+Example usage:
+    @coalesce("conj", key=lambda word: normalize_word(word))
+    async def fetch_conjugation(word: str) -> dict[str, str] | None: ...
+"""
+
+import asyncio
+import functools
+import unicodedata
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+from metrics import get_metrics
+from tracing import event
+
+T = TypeVar("T")
+
+
+def normalize_word(word: str) -> str:
+    """
+    Key of a word typed by a user. Accents are kept: they make different pages.
+
+    >>> normalize_word(" χαρά ") == normalize_word("χαρά")
+    True
+    """
+    return unicodedata.normalize("NFC", word.strip())
+
+
+class SingleFlight:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.calls: dict[Hashable, asyncio.Task] = {}
+        # Calls that awaited another one instead of doing the work.
+        self.saved = 0
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of function(), shared with the calls of the same key in flight."""
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(function())
+            self.calls[key] = task
+            task.add_done_callback(functools.partial(self._done, key))
+        else:
+            self.saved += 1
+            get_metrics().increment("singleflight_saved", group=self.name)
+            event("singleflight.coalesced", group=self.name, key=repr(key))
+
+        # A caller giving up (f.e. out of budget, cf. worker.py) does not cancel the others.
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # Retrieve the exception, in case every caller gave up.
+        if not task.cancelled():
+            task.exception()
+
+
+def coalesce(name: str, key: Callable[..., Hashable]) -> Callable:
+    """Decorate a coroutine function so that calls with the same key(*args, **kwargs) are coalesced."""
+    flight = SingleFlight(name)
+
+    def decorator(function: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(function)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            return await flight.do(key(*args, **kwargs), lambda: function(*args, **kwargs))
+
+        wrapper.flight = flight  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
@@ -0,0 +1,148 @@
+"""
+Lightweight tracing of the commands: fetch -> parse -> validate -> render.
+
+Every command opens a root span, and every upstream request and processing
+stage below it opens a child span. The current span is kept in a context
+variable, so that it follows the awaits (and the tasks created) of a command.
+Spans can carry attributes and timestamped events, the structured replacement
+of the debug prints.
+
+Traces are sampled at the root: either every span of a command is recorded,
+or none is. The spans of a sampled trace are exported, when its root ends,
+as JSON lines to a local file:
+    {"trace_id": ..., "span_id": ..., "parent_id": ..., "name": "fetch", "start": ...,
+     "duration": ..., "attributes": {"url": ...}, "events": [...], "error": null}
+
+Example usage:
+    with span("command", command="searchgr"):
+        with span("fetch", url=url) as fetch:
+            ...
+            fetch.set(status=200)
+        event("rejected", reason="no greek synonym")
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+DEFAULT_TRACE_PATH = "traces.jsonl"
+DEFAULT_SAMPLE_RATE = 0.1
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    sampled: bool
+    attributes: dict[str, Any] = field(default_factory=dict)
+    events: list[dict[str, Any]] = field(default_factory=list)
+    start: float = field(default_factory=time.time)
+    duration: float | None = None
+    error: str | None = None
+    # The finished spans of the trace, shared by all of them and exported with the root.
+    finished: list["Span"] = field(default_factory=list, repr=False)
+
+    def set(self, **attributes: Any) -> None:
+        if self.sampled:
+            self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        if self.sampled:
+            self.events.append({"name": name, "time": time.time(), **attributes})
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "events": self.events,
+            "error": self.error,
+        }
+
+
+class Tracer:
+    def __init__(
+        self, path: str | None = DEFAULT_TRACE_PATH, sample_rate: float = DEFAULT_SAMPLE_RATE
+    ) -> None:
+        # None: spans are still created (and sampled), but not exported.
+        self.path = path
+        self.sample_rate = sample_rate
+
+    def export(self, spans: list[Span]) -> None:
+        if self.path is None or not spans:
+            return
+        lines = "".join(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n" for span in spans)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar("current_span", default=None)
+_tracer = Tracer(path=None)
+
+
+def configure_tracing(
+    path: str | None = DEFAULT_TRACE_PATH, sample_rate: float = DEFAULT_SAMPLE_RATE
+) -> Tracer:
+    global _tracer
+
+    _tracer = Tracer(path, sample_rate)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def new_id() -> str:
+    return os.urandom(8).hex()
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Open a span, child of the current one if any, else the root of a new (maybe sampled) trace."""
+    parent = _current_span.get()
+    if parent is None:
+        sampled = random.random() < _tracer.sample_rate
+        current = Span(name, new_id(), new_id(), None, sampled)
+    else:
+        current = Span(
+            name, parent.trace_id, new_id(), parent.span_id, parent.sampled, finished=parent.finished
+        )
+    current.set(**attributes)
+
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = repr(e)
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        if current.sampled:
+            current.finished.append(current)
+            if parent is None:
+                _tracer.export(current.finished)
+
+
+def event(name: str, **attributes: Any) -> None:
+    """Log a structured event on the current span. Dropped outside of a sampled trace."""
+    current = _current_span.get()
+    if current is not None:
+        current.add_event(name, **attributes)
@@ -2,46 +2,19 @@ import json
 from typing import Callable, Optional
 
 import discord
-import requests
 from bs4 import BeautifulSoup
 
+from cache import fetch_page
+from lexicon.greeklish import transliterate
+from lexicon.lexicon import get_lexicon
+from metrics import get_metrics
+from tracing import span
+
 
 class NotFoundException(Exception):
     pass
 
 
-GREEKLISH = str.maketrans(
-    {
-        "a": "α",
-        "b": "β",
-        "c": "σ",  # There's no direct equivalent for 'c' in Greek, but 'σ' is commonly used in borrowed words
-        "d": "δ",
-        "e": "ε",
-        "f": "φ",
-        "g": "γ",
-        "h": "η",
-        "i": "ι",
-        "j": "τζ",  # The Greek equivalent of 'j' is 'τζ'
-        "k": "κ",
-        "l": "λ",
-        "m": "μ",
-        "n": "ν",
-        "o": "ο",
-        "p": "π",
-        "q": "κ",  # Similar to 'k'
-        "r": "ρ",
-        "s": "σ",
-        "t": "τ",
-        "u": "υ",
-        "v": "β",  # Similar to 'b'
-        "w": "ω",
-        "x": "χ",
-        "y": "υ",
-        "z": "ζ",  # The Greek equivalent of 'z' is 'ζ'
-    }
-)
-
-
 def is_english(word: str) -> bool:
     return all(ord(ch) < 200 for ch in word)
 
@@ -61,10 +34,24 @@ def print_json(obj):
 
 
 def greeklish_to_greek_characters(word: str) -> str:
-    return word.lower().translate(GREEKLISH)
+    """Transliterate greeklish, preferring the candidates known to the lexicon (cf. "efxaristo")."""
+    return transliterate(word, get_lexicon())
+
+
+def parse_headword(soup: BeautifulSoup) -> str | None:
+    """Scrape the (accented) headword of a Wordref page, if any."""
+    try:
+        return (
+            soup.find("table", {"class": "WRD"})
+            .find("tr", {"class": "even"})
+            .find("td", {"class": "FrWrd"})
+            .strong.text.split()[0]
+        )
+    except (AttributeError, IndexError):
+        return None
 
 
-def fix_greek_spelling(word: str) -> str:
+async def fix_greek_spelling(word: str) -> str:
     """
     Snippet from the wordref script that requests WordReference to get
     the greek accented version of a given word (which can be greeklish
@@ -77,25 +64,34 @@ def fix_greek_spelling(word: str) -> str:
         * fix_greek_spelling("nonsense") => nonsense
     """
 
+    with span("fix_greek_spelling", word=word) as current:
+        fixed = await _fix_greek_spelling(word)
+        current.set(fixed=fixed)
+        return fixed
+
+
+async def _fix_greek_spelling(word: str) -> str:
     greek_word_no_accents = greeklish_to_greek_characters(word)
+
+    # Most words are already known: no need to ask Wordref.
+    lexicon = get_lexicon()
+    if headword := lexicon.lookup(greek_word_no_accents):
+        get_metrics().increment("lexicon_requests", result="hit")
+        return headword
+    get_metrics().increment("lexicon_requests", result="miss")
+
     url = f"https://www.wordreference.com/gren/{greek_word_no_accents}"
-    response = requests.get(url)
-    response.raise_for_status()
-    soup = BeautifulSoup(response.text, "html.parser")
+    page = await fetch_page(url)
+    page.raise_for_status()
+    soup = BeautifulSoup(page.text, "html.parser")
 
-    try:
-        word = (
-            soup.find("table", {"class": "WRD"})
-            .find("tr", {"class": "even"})
-            .find("td", {"class": "FrWrd"})
-            .strong.text.split()[0]
-        )
-    except:
-        pass
+    word = parse_headword(soup) or word
 
     # We have to trim in case of multiple comma separated words. For example:
     # "https://www.wordreference.com/gren/αγαπώ" returns "αγαπάω," (from αγαπάω, αγαπώ)
     word = word.strip(",")
+    if not is_english(word):
+        lexicon.learn(word)
 
     return word
 
@@ -123,11 +119,17 @@ class Pagination(discord.ui.View):
         emb, self.total_pages = await self.get_page(self.index)
         assert self.total_pages is not None
 
+        # A deferred interaction (cf. rbot.defer_to_workers) is answered with a followup.
+        if self.interaction.response.is_done():
+            send = self.interaction.followup.send
+        else:
+            send = self.interaction.response.send_message
+
         if self.total_pages == 1:
-            await self.interaction.response.send_message(embed=emb)
+            await send(embed=emb)
         elif self.total_pages > 1:
             self.update_buttons()
-            await self.interaction.response.send_message(embed=emb, view=self)
+            await send(embed=emb, view=self)
 
     async def edit_page(self, interaction: discord.Interaction):
         emb, self.total_pages = await self.get_page(self.index)
@@ -0,0 +1,168 @@
+"""
+Client of the MediaWiki parse API of Wiktionary, to fetch sections instead of whole pages.
+
+A page of Wiktionary weighs tens of kilobytes (hundreds for the short words on
+English Wiktionary), but we only parse one of its language sections, and for
+the conjugations only the "Κλίση" subsection. The parse API returns the list
+of the sections of a page, then the HTML of a single section, without the
+skin around it.
+
+Disabled by default: enable it with WIKTIONARY_BACKEND=api in .env. Requests
+go through cache.fetch_page, so they are cached and rate limited like pages.
+
+Example usage:
+    api = configure_parse_api()
+    fragment = await api.fetch_section("αγαπώ", "el", "Νέα_ελληνικά_(el)", "Κλίση")
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from urllib.parse import urlencode
+
+from cache import fetch_page
+from metrics import get_metrics
+
+DEFAULT_API_URL = "https://{lcode}.wiktionary.org/w/api.php"
+
+logger = logging.getLogger("wiktionary")
+
+
+@dataclass(frozen=True)
+class Section:
+    # Position in the page, as expected by the section parameter of the API.
+    index: str
+    level: int
+    anchor: str
+
+
+@dataclass(frozen=True)
+class Fragment:
+    html: bytes
+    # Anchor of the subsection fetched, None for the whole language section.
+    section: str | None
+
+
+# An empty fragment, for the pages that do not exist.
+MISSING = Fragment(b'<div class="mw-content-ltr mw-parser-output"></div>', None)
+
+
+def find_section(sections: list[Section], language: str, anchor: str | None = None) -> Section | None:
+    """
+    Return the section of language (the anchor of its h2), or its subsection of anchor.
+
+    >>> sections = [Section("1", 2, "Greek"), Section("2", 3, "Verb"), Section("3", 2, "Latin")]
+    >>> find_section(sections, "Greek", "Verb")
+    Section(index='2', level=3, anchor='Verb')
+    >>> find_section(sections, "Latin", "Verb") is None
+    True
+    """
+    in_language = False
+    for section in sections:
+        if section.level == 2:
+            if in_language:
+                break
+            in_language = section.anchor == language
+            if in_language and anchor is None:
+                return section
+        elif in_language and section.anchor == anchor:
+            return section
+    return None
+
+
+class ParseApi:
+    def __init__(self, api_url: str = DEFAULT_API_URL) -> None:
+        # Formatted with the language code of the edition.
+        self.api_url = api_url
+
+    def url(self, lcode: str, **params: str) -> str:
+        params = {"action": "parse", "format": "json", "formatversion": "2", "redirects": "1", **params}
+        return f"{self.api_url.format(lcode=lcode)}?{urlencode(params)}"
+
+    async def query(self, lcode: str, **params: str) -> dict | None:
+        """Return the parse result, {} if the page does not exist, None if the API failed."""
+        page = await fetch_page(self.url(lcode, **params))
+        if page.status != 200:
+            logger.warning(f"Parse API returned {page.status} for {page.url}.")
+            return None
+        try:
+            response = json.loads(page.body)
+        except ValueError:
+            logger.warning(f"Parse API returned invalid JSON for {page.url}.")
+            return None
+        if "error" in response:
+            if response["error"].get("code") == "missingtitle":
+                return {}
+            logger.warning(f"Parse API error for {page.url}: {response['error']}.")
+            return None
+        return response.get("parse")
+
+    async def fetch_sections(self, word: str, lcode: str) -> list[Section] | None:
+        """Return the sections of the page of word ([] if there is no such page), None on failure."""
+        parsed = await self.query(lcode, page=word, prop="sections")
+        if parsed is None:
+            return None
+        sections = []
+        for section in parsed.get("sections", []):
+            # Sections transcluded from templates (index "T-1") can not be fetched by index.
+            if section["index"].isdigit():
+                sections.append(Section(section["index"], int(section["level"]), section["anchor"]))
+        return sections
+
+    async def fetch_section(
+        self, word: str, lcode: str, language: str, anchor: str | None = None
+    ) -> Fragment | None:
+        """
+        Return the HTML of the language section of the page of word, or of its
+        subsection of anchor if there is one. None if the whole page is needed.
+        """
+        sections = await self.fetch_sections(word, lcode)
+        if sections is None:
+            return None
+        if not sections:
+            get_metrics().increment("parse_api_requests", result="missing")
+            return MISSING
+
+        section = None
+        if anchor is not None:
+            section = find_section(sections, language, anchor)
+        if section is None:
+            anchor = None
+            section = find_section(sections, language)
+        if section is None:
+            # F.e. a page where the language heading is not in the expected format.
+            get_metrics().increment("parse_api_requests", result="fallback")
+            return None
+
+        parsed = await self.query(
+            lcode,
+            page=word,
+            prop="text",
+            section=section.index,
+            disableeditsection="1",
+            disablelimitreport="1",
+        )
+        if not parsed or "text" not in parsed:
+            get_metrics().increment("parse_api_requests", result="fallback")
+            return None
+
+        get_metrics().increment("parse_api_requests", result="section" if anchor else "language")
+        html = parsed["text"]
+        if 'class="mw-content-ltr mw-parser-output"' not in html[:200]:
+            html = f'<div class="mw-content-ltr mw-parser-output">{html}</div>'
+        return Fragment(html.encode(), anchor)
+
+
+_parse_api: ParseApi | None = None
+
+
+def configure_parse_api(api_url: str | None = DEFAULT_API_URL) -> ParseApi | None:
+    """Fetch the Wiktionary sections through the API of api_url, or the whole pages if None."""
+    global _parse_api
+
+    _parse_api = ParseApi(api_url) if api_url is not None else None
+    return _parse_api
+
+
+def get_parse_api() -> ParseApi | None:
+    return _parse_api
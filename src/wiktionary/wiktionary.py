@@ -6,48 +6,142 @@ Returns as a JSON containing word types and entries
 TODO: Unify the parsing.
 """
 
+import asyncio
 import logging
+import re
+from dataclasses import dataclass, field
 from typing import Any
+from urllib.parse import unquote, urlsplit
 
-from aiohttp import ClientSession
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 
+from cache import PageCache, fetch_page
+from lexicon.inflections import get_inflections
+from metrics import get_metrics, timed
+from singleflight import coalesce, normalize_word
+from tracing import event
 from utils import get_language_code
+from wiktionary.parse_api import get_parse_api
 
 default_language = "greek"
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("wiktionary")
 
+# Headings of the entries we parse. Pages with several of them number the
+# next ones: f.e. "Ετυμολογία_1", "Ετυμολογία_2"
 # fmt: off
 ENTRIES = [
-    "Ετυμολογία", "Ετυμολογία_1", "Ετυμολογία_2", 
-    "Προφορά", "Προφορά_1", "Προφορά_2",
-    "Επιφώνημα", "Έκφραση", "Ουσιαστικό", 
+    "Ετυμολογία", "Προφορά",
+    "Επιφώνημα", "Έκφραση", "Ουσιαστικό",
     "Εκφράσεις", "Επίθετο", "Επίρρημα", "Συνώνυμα", "Αντώνυμα",
     "Κλιτικός_τύπος_επιθέτου", "Κλιτικός_τύπος_ουσιαστικού",
     "Πολυλεκτικοί_όροι", "Σημειώσεις"
 ] # Μεταφράσεις, "Σύνθετα", "Συγγενικά" cut off here
 ENTRIES_EN = [
-    "Etymology", "Etymology_1", "Etymology_2",
-    "Pronunciation", "Pronunciation_2", "Pronunciation_3",
-    "Interjection", "Interjection_2", "Expression",
-    "Expression_2", "Expressions", "Noun", "Noun_2",
-    "Adjective", "Adjective_2", "Adverb", "Adverb_2",
-    "Related", "Synonyms", "Antonyms", "Synonyms_2", "Antonyms_2"
+    "Etymology", "Pronunciation",
+    "Interjection", "Expression", "Expressions", "Noun",
+    "Adjective", "Adverb", "Related", "Synonyms", "Antonyms"
 ]
 # fmt: on
+ENTRY_NUMBER_RE = re.compile(r"_\d+$")
+HEADING_LEVELS = {"h2": 2, "h3": 3, "h4": 4, "h5": 5}
+# Suggestions of other pages for the same word.
+DEITE = ["→ δείτε τη λέξη", "→\xa0δείτε\xa0τη\xa0λέξη"]
+OTHER_FORM = "άλλη μορφή"
+# Id of the h2 heading of the section we parse, per edition.
+# English Wiktionary has one section per language on the same page.
+LANGUAGE_SECTIONS = {
+    "greek": "Νέα_ελληνικά_(el)",
+    "english": "Greek",
+}
+# Subsection of the conjugation tables, on Greek Wiktionary.
+CONJUGATION_SECTION = "Κλίση"
+# Suggested words tried when a page has no conjugation table, and how many are fetched at a time.
+MAX_SUGGESTIONS = 8
+SUGGESTION_FANOUT = 4
+# Where the content of a page ends, in the order of the page.
+CONTENT_END_MARKERS = [b'<div class="printfooter"', b'<div id="catlinks"', b"</main>", b"<footer"]
+NEXT_SECTION_RE = re.compile(rb'<div class="mw-heading mw-heading2"|<h2\b')
+# First cell of the rows of a declension table (nouns, adjectives...)
+GRAMMATICAL_CASES = ["ονομαστική", "γενική", "αιτιατική", "κλητική"]
+
+
+@dataclass
+class Heading:
+    level: int
+    id: str
+    tag: Tag
+
+    @property
+    def body(self) -> list[Tag]:
+        """The elements of the section of the heading, up to the next heading."""
+        start = self.tag
+        # Current markup: <div class="mw-heading mw-heading3"><h3 id="...">...</h3></div>
+        if self.tag.parent is not None and "mw-heading" in self.tag.parent.get("class", []):
+            start = self.tag.parent
+
+        elements: list[Tag] = []
+        for sibling in start.next_siblings:
+            if not isinstance(sibling, Tag):
+                continue
+            if sibling.name in HEADING_LEVELS or "mw-heading" in sibling.get("class", []):
+                break
+            elements.append(sibling)
+        return elements
 
 
-class WiktionaryQuery:
-    __slots__ = "word", "language", "soup"
+@dataclass
+class PageIndex:
+    """The parts of a page the extractors need, found in a single walk of the soup."""
+
+    # The first h2-h5 of every id, in the order of the page.
+    headings: dict[str, Heading] = field(default_factory=dict)
+    # The NavContent divs and list items with a "δείτε τη λέξη" suggestion.
+    deite_navs: list[Tag] = field(default_factory=list)
+    deite_items: list[Tag] = field(default_factory=list)
+    # The list items with a suggestion of another form of the word.
+    other_form_items: list[Tag] = field(default_factory=list)
 
     @classmethod
-    async def create(cls, word: str, language: str, printable: bool = True):
-        # https://stackoverflow.com/questions/33128325/how-to-set-class-attribute-with-await-in-init
-        self = cls()
-        self.word = word
+    def from_soup(cls, soup: Any) -> "PageIndex":
+        index = cls()
+        for tag in soup.find_all(True):
+            if tag.name in HEADING_LEVELS:
+                if (heading_id := tag.get("id")) and heading_id not in index.headings:
+                    index.headings[heading_id] = Heading(HEADING_LEVELS[tag.name], heading_id, tag)
+            elif tag.name == "li":
+                text = tag.text
+                if any(d in text for d in DEITE):
+                    index.deite_items.append(tag)
+                if OTHER_FORM in text:
+                    index.other_form_items.append(tag)
+            elif tag.name == "div" and "NavContent" in tag.get("class", []):
+                if any(d in tag.text for d in DEITE):
+                    index.deite_navs.append(tag)
+        return index
+
 
+class WiktionaryQuery:
+    __slots__ = "word", "language", "soup", "section", "_index"
+
+    @classmethod
+    async def create(cls, word: str, language: str, printable: bool = True, section: str | None = None):
+        """
+        Fetch the section of language of the page of word.
+
+        With the parse API (cf. parse_api.py), only that section is downloaded,
+        or only its subsection of anchor section (f.e. CONJUGATION_SECTION) if
+        the page has one. Else, the whole page is.
+        """
         lcode = get_language_code(language)
+
+        if (api := get_parse_api()) is not None:
+            fragment = await api.fetch_section(word, lcode, LANGUAGE_SECTIONS[language], section)
+            if fragment is not None:
+                query = cls.from_html(word, language, fragment.html)
+                query.section = fragment.section
+                return query
+
         # Not sure why we would want the printable version here.
         URL = f"https://{lcode}.wiktionary.org/wiki/{{}}"
         if printable:
@@ -56,17 +150,43 @@ class WiktionaryQuery:
         url = URL.format(word)
         logger.info(f"{url=}")
 
-        async with ClientSession() as session:
-            async with session.get(url) as response:
-                page_content = await response.read()
+        page = await fetch_page(url)
+
+        # https://stackoverflow.com/questions/33128325/how-to-set-class-attribute-with-await-in-init
+        return cls.from_html(word, language, page.body)
+
+    @classmethod
+    @timed("wiktionary.from_html")
+    def from_html(cls, word: str, language: str, html: bytes | str):
+        self = cls()
+        self.word = word
+        self.language = language
+        # The whole language section, or the page if it has none.
+        self.section = None
+        self._index = None
 
-        soup = BeautifulSoup(page_content, "html.parser")
-        WiktionaryQuery.remove_ancient_greek(soup, language)
+        if isinstance(html, str):
+            html = html.encode()
+
+        section = slice_language_section(html, language)
+        if section is not None:
+            soup = BeautifulSoup(section, "html.parser")
+        else:
+            # No (recognizable) section: parse the whole page.
+            soup = BeautifulSoup(html, "html.parser")
+            WiktionaryQuery.remove_ancient_greek(soup, language)
 
         self.soup = soup
 
         return self
 
+    @property
+    def index(self) -> PageIndex:
+        """The headings and suggestions of the page, indexed on first use."""
+        if self._index is None:
+            self._index = PageIndex.from_soup(self.soup)
+        return self._index
+
     @staticmethod
     def remove_ancient_greek(soup: Any, language: str) -> None:
         """Mutates soup to remove ancient greek elements."""
@@ -89,13 +209,50 @@ class WiktionaryQuery:
                 current_element = next_sibling
 
 
+def slice_language_section(html: bytes, language: str) -> bytes | None:
+    """
+    Cut the section of the language we parse out of the raw page, before any parsing.
+
+    A page of English Wiktionary holds every language with an entry for the word,
+    and is often megabytes long, while only the Greek section is ever used.
+    The slice is wrapped in a parser-output div, as the conjugation parsing expects.
+    Return None if the section can not be found.
+
+    >>> page = b'<h2 id="English">English</h2>en<h2 id="Greek">Greek</h2>el<h2 id="Italian">'
+    >>> slice_language_section(page, "english")
+    b'<div class="mw-content-ltr mw-parser-output"><h2 id="Greek">Greek</h2>el</div>'
+    """
+    section_id = re.escape(LANGUAGE_SECTIONS[language].encode())
+    # Current markup: <h2 id="Greek">, older one: <h2><span class="mw-headline" id="Greek">
+    heading_re = rb'<h2\b[^>]*?\bid="%b"|<h2\b[^>]*>\s*<span\b[^>]*?\bid="%b"' % (section_id, section_id)
+    heading = re.search(heading_re, html)
+    if heading is None:
+        return None
+
+    start = heading.start()
+    wrapper = html.rfind(b'<div class="mw-heading mw-heading2"', 0, start)
+    if wrapper != -1 and html[wrapper:start].count(b"<") == 1:
+        start = wrapper
+
+    end = len(html)
+    if next_section := NEXT_SECTION_RE.search(html, heading.end()):
+        end = next_section.start()
+    else:
+        for marker in CONTENT_END_MARKERS:
+            if (position := html.find(marker, heading.end())) != -1:
+                end = min(end, position)
+
+    return b'<div class="mw-content-ltr mw-parser-output">' + html[start:end] + b"</div>"
+
+
+@coalesce("conj", key=normalize_word)
 async def fetch_conjugation(word: str) -> dict[str, str] | None:
     """
     Fetch the verb conjugation table from a word.
     Retry with word variations by parsing wiktionary.
     """
 
-    query = await WiktionaryQuery.create(word, default_language, printable=False)
+    query = await WiktionaryQuery.create(word, default_language, printable=False, section=CONJUGATION_SECTION)
     conjugation = await _fetch_conjugation(query)
     logger.info("Success." if conjugation else "Failure.")
     return conjugation
@@ -107,65 +264,87 @@ async def _fetch_conjugation(query: WiktionaryQuery) -> dict[str, str] | None:
         return res
 
     logger.info("Trying suggestions.")
+    if query.section is not None:
+        # Only the conjugation subsection was fetched: the suggestions are elsewhere.
+        query = await WiktionaryQuery.create(query.word, query.language, printable=False)
     # FIXME: parses too many things
     suggestions = parse_suggestions(query)
     logger.info(f"Found {len(suggestions)} suggestions.")
+
     # Maybe there are cyclic references?
-    max_retries = 10
-    seen_words = {query.word}
+    candidates = [word for word in dict.fromkeys(suggestions) if word != query.word]
+    if len(candidates) > MAX_SUGGESTIONS:
+        logger.warning(f"Trying only {MAX_SUGGESTIONS} of {len(candidates)} suggestions.")
+        candidates = candidates[:MAX_SUGGESTIONS]
+
+    return await _first_conjugation(candidates)
 
-    for suggestion in suggestions:
-        if suggestion in seen_words:
-            continue
-        seen_words.add(suggestion)
 
-        if len(seen_words) >= max_retries:
-            logger.warning(f"Reached {max_retries=}")
-            return None
+async def _first_conjugation(suggestions: list[str]) -> dict[str, str] | None:
+    """
+    Return the conjugation of the first suggestion, in order, that has one.
 
-        new_query = await WiktionaryQuery.create(suggestion, default_language, printable=False)
-        res = _parse_conjugation(new_query)
-        # If we succeed with a suggestion, just return it,
-        # even if it is potentially not the best?
-        if res is not None:
-            return res
+    The suggestions are fetched concurrently, at most SUGGESTION_FANOUT at a time.
+    Once one has a conjugation, the ones after it can not win and are cancelled.
+    """
+    semaphore = asyncio.Semaphore(SUGGESTION_FANOUT)
+
+    async def try_suggestion(suggestion: str) -> dict[str, str] | None:
+        async with semaphore:
+            get_metrics().increment("retries", kind="conjugation_suggestion")
+            try:
+                query = await WiktionaryQuery.create(
+                    suggestion, default_language, printable=False, section=CONJUGATION_SECTION
+                )
+                return _parse_conjugation(query)
+            except (AssertionError, KeyError):
+                # Conjugation tables with an unexpected shape.
+                logger.warning(f"Could not parse the conjugation table of {suggestion}.")
+                return None
+            except Exception as e:
+                # F.e. a network error: the suggestion loses, the others go on.
+                event("wiktionary.suggestion_failed", suggestion=suggestion, error=repr(e))
+                return None
+
+    tasks = [asyncio.create_task(try_suggestion(suggestion)) for suggestion in suggestions]
+    # Index of the first suggestion known to have a conjugation.
+    best: int | None = None
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                idx = tasks.index(task)
+                if task.result() is not None and (best is None or idx < best):
+                    best = idx
+            if best is not None:
+                for task in tasks[best + 1 :]:
+                    task.cancel()
+                pending = {task for task in pending if tasks.index(task) < best}
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if best is None:
+        return None
+    logger.info(f"Using the conjugation of the suggestion {suggestions[best]}.")
+    return tasks[best].result()
 
 
 def parse_suggestions(query: WiktionaryQuery) -> list[str]:
     """Generic helper to parse suggested words in case of failure."""
-    # TODO: merge li soups (needs further testing).
     suggestions: list[str] = list()
 
-    # Search for deite (see also...) suggestions
-    DEITE = ["→ δείτε τη λέξη", "→\xa0δείτε\xa0τη\xa0λέξη"]
-
-    # cf: https://el.wiktionary.org/wiki/αγαπώ?printable=yes
-    res = query.soup.find_all("div", {"class": "NavContent"})
-    for div in res:
-        if any(d in div.text for d in DEITE):
-            links = div.find_all("a", title=True)
-            for link in links:
-                suggestions.append(link["title"])
-
-    # Sometimes deite suggestions are elsewhere.
-    # Here we search everything (even though we could potentially find
-    # an unwanted match somewhere?).
-    # cf: https://el.wiktionary.org/wiki/βρίσκομαι?printable=yes
-    res = query.soup.find_all("li")
-    for span in res:
-        if any(d in span.text for d in DEITE):
-            links = span.find_all("a", title=True)
-            for link in links:
-                suggestions.append(link["title"])
-
-    # Search for other verb forms
-    # cf: https://el.wiktionary.org/wiki/περπατώ?printable=yes
-    res = query.soup.find_all("li")
-    for li in res:
-        if "άλλη μορφή" in li.text:
-            links = li.find_all("a", title=True)
-            for link in links:
-                suggestions.append(link["title"])
+    # In order: the deite (see also...) suggestions of the NavContents
+    # (cf: https://el.wiktionary.org/wiki/αγαπώ?printable=yes), the ones
+    # elsewhere on the page, even though we could potentially find an unwanted
+    # match there (cf: https://el.wiktionary.org/wiki/βρίσκομαι?printable=yes),
+    # then the other verb forms (cf: https://el.wiktionary.org/wiki/περπατώ?printable=yes).
+    index = query.index
+    for element in index.deite_navs + index.deite_items + index.other_form_items:
+        for link in element.find_all("a", title=True):
+            suggestions.append(link["title"])
 
     if not suggestions:
         logger.warning(f"Found no suggestions for {query.word}.")
@@ -173,6 +352,7 @@ def parse_suggestions(query: WiktionaryQuery) -> list[str]:
     return suggestions
 
 
+@timed("wiktionary.parse_conjugation")
 def _parse_conjugation(query: WiktionaryQuery) -> dict[str, str] | None:
     """
     Parse the verb conjugation table from a word.
@@ -183,7 +363,8 @@ def _parse_conjugation(query: WiktionaryQuery) -> dict[str, str] | None:
     # Check that the conjugation header is there.
     # Note that the header doesn't guarantee a valid conjugation table.
     # cf. https://el.wiktionary.org/wiki/βρέχω?printable=yes
-    if query.soup.find("h4", {"id": "Κλίση"}) is None:
+    heading = query.index.headings.get(CONJUGATION_SECTION)
+    if heading is None or heading.level != 4:
         logger.info(f"{query.word} has no conjugation table.")
         return None
 
@@ -251,6 +432,8 @@ def _parse_conjugation_table_one(query: WiktionaryQuery) -> dict[str, str] | Non
         return None
 
     parsed: dict[str, dict[str, list[str]]] = dict()
+    # Every form of every tense and voice, for the inflection index.
+    inflected_forms: list[str] = list()
     for idx_voice, voice_data in enumerate(table_data):
         if not len(voice_data) % 8 == 0:
             logger.warning(f"The data size is not a multiple of 8: {len(voice_data)}")
@@ -263,9 +446,14 @@ def _parse_conjugation_table_one(query: WiktionaryQuery) -> dict[str, str] | Non
             table = list(zip(*voice_data[8 * i + 1 : 8 * (i + 1)]))
             for entry in table:
                 parsed_voice[entry[0]] = list(entry[1:])
+            # The first column holds the personal pronouns.
+            for entry in table[1:]:
+                inflected_forms.extend(entry[1:])
 
         parsed[VERB_VOICES[idx_voice]] = parsed_voice
 
+    get_inflections().learn(query.word, inflected_forms)
+
     # Just hack something visual for the moment
     RELEVANT_TENSES = ["Ενεστώτας", "Παρατατικός", "Αόριστος", "Συνοπτ. Μέλλ."]
 
@@ -335,61 +523,131 @@ def _parse_conjugation_table_two(query: WiktionaryQuery) -> dict[str, str] | Non
         parsed[col[0]] = list(col[1:])
     # print(parsed)
 
+    # The first column holds the personal pronouns.
+    inflected_forms = [form for forms in list(parsed.values())[1:] for form in forms]
+    get_inflections().learn(query.word, inflected_forms)
+
     RELEVANT_TENSES = ["Ενεστώτας", "Παρατατικός"]
     relevant_parsed = {tense: "\n".join(parsed[tense]) for tense in RELEVANT_TENSES}
 
     return relevant_parsed
 
 
+def _parse_declension_table(query: WiktionaryQuery) -> list[str] | None:
+    """
+    Parse the inflected forms of the declension tables (nouns, adjectives...)
+    of a word, with their articles. Cf.
+    https://el.wiktionary.org/wiki/τραπέζι?printable=yes
+
+    Return None if the page has no declension table.
+    """
+    inflected_forms: list[str] = list()
+
+    for table in query.soup.find_all("table"):
+        for row in table.find_all("tr"):
+            cells = row.find_all(["th", "td"])
+            if not cells:
+                continue
+            # The rows of the cases start with their name, the others are headers.
+            header = cells[0].get_text(strip=True)
+            if not any(header.startswith(case) for case in GRAMMATICAL_CASES):
+                continue
+
+            for cell in cells[1:]:
+                for br in cell.find_all("br"):
+                    br.replace_with(" / ")
+                text = cell.get_text(" ", strip=True)
+                if text:
+                    inflected_forms.append(text)
+
+    return inflected_forms or None
+
+
+def index_inflections(query: WiktionaryQuery) -> None:
+    """
+    Add the declined forms of a greek page to the inflection index.
+    The conjugated forms are added when parsing the conjugation tables.
+    """
+    inflected_forms = _parse_declension_table(query)
+    if inflected_forms is not None:
+        get_inflections().learn(query.word, inflected_forms)
+
+
+def index_page_cache(page_cache: PageCache) -> None:
+    """Index the inflection tables of every greek Wiktionary page stored in the page cache."""
+    rows = page_cache.connection.execute(
+        "SELECT url, body FROM pages WHERE url LIKE 'https://el.wiktionary.org/wiki/%'"
+    ).fetchall()
+    for url, body in rows:
+        word = unquote(urlsplit(url).path.removeprefix("/wiki/"))
+        query = WiktionaryQuery.from_html(word, default_language, body)
+        index_inflections(query)
+        try:
+            _parse_conjugation(query)
+        except (AssertionError, KeyError):
+            # Conjugation tables with an unexpected shape: index what we can.
+            logger.warning(f"Could not parse the conjugation table of {word}.")
+
+    logger.info(f"Indexed the inflections of {len(rows)} cached pages.")
+
+
+@coalesce("wiktionary", key=lambda word, language: (normalize_word(word), language))
 async def fetch_wiktionary_pos(word: str, language: str) -> dict[str, list[str]]:
     query = await WiktionaryQuery.create(word, language)
     entries = parse_wiktionary_pos(query, language)
+    if language == default_language:
+        index_inflections(query)
     return entries
 
 
+@timed("wiktionary.parse_pos")
 def parse_wiktionary_pos(query: WiktionaryQuery, language: str) -> dict[str, list[str]]:
-    entries = ENTRIES[:]
+    entries = ENTRIES
     if language == "english":
-        entries = ENTRIES_EN[:]
+        entries = ENTRIES_EN
+
+    # Every numbered heading of an entry, grouped in the order of ENTRIES.
+    headings = [
+        heading
+        for heading in query.index.headings.values()
+        if heading.level in (3, 4) and ENTRY_NUMBER_RE.sub("", heading.id) in entries
+    ]
+    headings.sort(key=lambda heading: entries.index(ENTRY_NUMBER_RE.sub("", heading.id)))
 
     parts_of_speech: dict[str, list[str]] = dict()
-    for entry in entries:
-        entry_elements = parse_entry(query, entry)
-        if entry_elements is not None:
-            parts_of_speech[entry] = entry_elements
+    for heading in headings:
+        parts_of_speech[heading.id] = parse_entry(query, heading.id)
 
     return parts_of_speech
 
 
 def parse_entry(query: WiktionaryQuery, entry_type: str) -> list[str] | None:
     # find position of page element with desired type
-    results = query.soup.find(["h3", "h4"], id=entry_type)
-    if not results:
+    heading = query.index.headings.get(entry_type)
+    if heading is None or heading.level not in (3, 4):
         return None
 
     entry_elements: list[str] = []
-    # due to wiktionary formatting, finds body under the entry
-    next_element = results.parent.find_next_sibling()
+    # due to wiktionary formatting, finds body under the heading
+    body = heading.body
 
     # used for translations and other lists in divs
-    if next_element and next_element.name == "div":
-        list_element = next_element.find_all("li")
-        if list_element:
-            for element in list_element:
-                # add to the entry list
-                entry_elements.append(element.text)
+    if body and body[0].name == "div":
+        for element in body[0].find_all("li"):
+            # add to the entry list
+            entry_elements.append(element.text)
     else:
-        # these element types denote new entries so they terminate the loop
-        while next_element and next_element.name not in ["h3", "h4", "h5", "div"]:
-            list_element = next_element.find_all("li")
+        for element in body:
+            # divs denote new entries so they terminate the loop
+            if element.name == "div":
+                break
+            list_element = element.find_all("li")
             # if only one instance of entry (e.g. only one definition)
             if not list_element:
-                entry_elements.append(next_element.text)
-                next_element = next_element.find_next_sibling()
+                entry_elements.append(element.text)
             else:
-                for element in list_element:
-                    entry_elements.append(element.text)
-                next_element = next_element.find_next_sibling()
+                for li in list_element:
+                    entry_elements.append(li.text)
 
     return entry_elements
 
@@ -1,12 +1,31 @@
 import pprint
 import urllib
+from dataclasses import dataclass
 
 import discord
 
-from wordref.longest import highlight_synonyms
+from lexicon.inflections import get_inflections
+from metrics import timed
+from tracing import event
+from wordref.longest import highlight_sentences, highlight_synonyms
 
-TAG = "\033[35mENTRY:  \033[0m"
-EXIT = "\033[31m[EXIT]\033[0m"
+
+@dataclass(frozen=True)
+class ParsedEntry:
+    """
+    The scraped data of an Entry, without any of the rendering options.
+
+    Safe to share between lookups: Entry.from_parsed copies the mutable parts.
+    """
+
+    link: str
+    gr_word: str
+    gr_en: bool
+    en_word: str | None
+    gr_synonyms: frozenset[str]
+    en_synonyms: frozenset[str]
+    sentences: tuple[tuple[str, tuple[str, str]], ...]
+    gr_pos: str | None
 
 
 class Entry:
@@ -33,36 +52,77 @@ class Entry:
         self.en_word = None
         self.gr_synonyms = set()
         self.en_synonyms = set()
-        self.sentences = set()
+        # (greek, english) pairs keyed by their pivot sentence: the english one
+        # if gr_en, else the greek one (cf. Wordref.try_fetch_sentence_pair).
+        self.sentences: dict[str, tuple[str, str]] = {}
         self.gr_pos = None  # Parts of speech
 
         self.embed = None
 
+    @classmethod
+    def from_parsed(
+        cls,
+        parsed: ParsedEntry,
+        hide_words: bool,
+        min_sentences_shown: int,
+        max_sentences_shown: int,
+        is_random: bool,
+    ) -> "Entry":
+        entry = cls(
+            parsed.link,
+            parsed.gr_word,
+            parsed.gr_en,
+            hide_words,
+            min_sentences_shown,
+            max_sentences_shown,
+            is_random,
+        )
+        entry.en_word = parsed.en_word
+        entry.gr_synonyms = set(parsed.gr_synonyms)
+        entry.en_synonyms = set(parsed.en_synonyms)
+        entry.sentences = dict(parsed.sentences)
+        entry.gr_pos = parsed.gr_pos
+        return entry
+
+    def to_parsed(self) -> ParsedEntry:
+        """Snapshot the scraped data. Must be called before add_embed, that mutates the entry."""
+        assert self.embed is None
+        return ParsedEntry(
+            self.link,
+            self.gr_word,
+            self.gr_en,
+            self.en_word,
+            frozenset(self.gr_synonyms),
+            frozenset(self.en_synonyms),
+            tuple(self.sentences.items()),
+            self.gr_pos,
+        )
+
     @property
     def is_valid_entry(self) -> bool:
         word = self.gr_word
 
         if not self.link:
-            print(f"{TAG} {EXIT}, couldn't find the link for {word}.")
+            event("entry.rejected", word=word, reason="no link")
             return False
         if not self.gr_word:
-            print(f"{TAG} {EXIT}, couldn't find the greek word for {word}.")
+            event("entry.rejected", word=word, reason="no greek word")
             return False
         if not self.en_word:
-            print(f"{TAG} {EXIT}, couldn't find the english word for {word}.")
+            event("entry.rejected", word=word, reason="no english word")
             return False
         if not self.gr_synonyms:
-            print(f"{TAG} {EXIT}, couldn't find a greek synonym for {word}.")
+            event("entry.rejected", word=word, reason="no greek synonym")
             return False
         if not self.en_synonyms:
-            print(f"{TAG} {EXIT}, couldn't find an english synonym for {word}.")
+            event("entry.rejected", word=word, reason="no english synonym")
             return False
         if not len(self.sentences) >= self.min_sentences_shown:
-            print(f"{TAG} {EXIT}, couldn't find enough sentences ({self.min_sentences_shown}) for {word}.")
+            event("entry.rejected", word=word, reason=f"less than {self.min_sentences_shown} sentences")
             return False
 
         if not self.gr_pos:
-            print(f"{TAG} [WARN], couldn't find POS for {word}.")
+            event("entry.warning", word=word, reason="no POS")
 
         return True
 
@@ -73,12 +133,14 @@ class Entry:
         # To prevent Discord message length error:
         # HTTPException: 400 Bad Request (error code: 40060)
         if len(self.embed) >= 2000:
+            event("entry.rejected", word=self.gr_word, reason="embed too long")
             return False
 
         return True
 
     def sort_sentences_by_contains_word(self) -> None:
-        self.sentences = list(self.sentences)
+        # The sort is stable: ties keep the page order.
+        self.sentences = list(self.sentences.values())
         if self.gr_en:
             self.sentences.sort(key=lambda pair: self.gr_word in pair[0], reverse=True)
         else:
@@ -90,10 +152,10 @@ class Entry:
         print()
         print("#" * 70)
 
-        # Some sortings for easier reading (CARE IT CHANGES THE SET TO LIST).
+        # Some sortings for easier reading.
         sorted_gr_synonyms = sorted(self.gr_synonyms)
         sorted_en_synonyms = sorted(self.en_synonyms)
-        self.sentences = sorted(self.sentences)
+        sorted_sentences = sorted(self.sentences.values())
 
         msg = "\n"
         msg += f"{self.link}\n"
@@ -105,11 +167,11 @@ class Entry:
         msg += f"Greek synonyms: ----- {sorted_gr_synonyms}\n"
         msg += f"English synonyms: --- {sorted_en_synonyms}\n"
         msg += "\n"
-        for idx, (gsen, esen) in enumerate(self.sentences):
+        for idx, (gsen, esen) in enumerate(sorted_sentences):
             if idx >= self.max_sentences_shown:
                 break
             msg += f"> {idx + 1}: {gsen}\n"
-            msg += f"> {idx + 1}: {highlight_synonyms(gsen, self.gr_synonyms)}\n"
+            msg += f"> {idx + 1}: {highlight_synonyms(gsen, self.gr_synonyms, get_inflections())}\n"
             msg += f"> {idx + 1}: {esen}\n"
             msg += f"> {idx + 1}: {highlight_synonyms(esen, self.en_synonyms)}\n"
 
@@ -123,6 +185,7 @@ class Entry:
             # webbrowser.open_new(f"https://{encoded_url}")
             print(f"https://{encoded_url}")
 
+    @timed("wordref.add_embed")
     def add_embed(
         self,
         show_pos=True,
@@ -145,7 +208,7 @@ class Entry:
         else:
             # Swap gr and en
             self.gr_word, self.en_word = self.en_word, self.gr_word
-            self.sentences = [(esen, gsen) for gsen, esen in self.sentences]
+            self.sentences = {pivot: (esen, gsen) for pivot, (gsen, esen) in self.sentences.items()}
             pos = ""
 
         if not show_pos:
@@ -173,12 +236,17 @@ class Entry:
         ## sentences
         self.sort_sentences_by_contains_word()
         sentences = "**Sentences:**\n"
+        shown_sentences = self.sentences[: self.max_sentences_shown]
+        # Highlight every shown sentence in one batch per language.
+        # Only the greek forms are indexed: the english ones use fuzzy matching.
+        gr_highlighted = highlight_sentences(
+            [gsen for gsen, _ in shown_sentences], self.gr_synonyms, get_inflections()
+        )
+        en_highlighted = highlight_sentences([esen for _, esen in shown_sentences], self.en_synonyms)
         # We can't write "> {idx}." with a dot because Discord will overwrite the indexes.
-        for idx, (gsen, esen) in enumerate(self.sentences):
-            if idx >= self.max_sentences_shown:
-                break
-            sentences += f"> {idx + 1}: {highlight_synonyms(gsen, self.gr_synonyms)}\n"
-            sentences += f"> {idx + 1}: {sep}{highlight_synonyms(esen, self.en_synonyms)}{sep}\n"
+        for idx, (gsen, esen) in enumerate(zip(gr_highlighted, en_highlighted)):
+            sentences += f"> {idx + 1}: {gsen}\n"
+            sentences += f"> {idx + 1}: {sep}{esen}{sep}\n"
 
         description = ""
         if show_translations:
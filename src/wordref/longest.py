@@ -1,26 +1,87 @@
+import functools
 import re
 import unicodedata
-from typing import Set
+from typing import TYPE_CHECKING, Set
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from metrics import timed
+
+if TYPE_CHECKING:
+    from lexicon.inflections import InflectionIndex
+
+# What separates the words of a sentence: whitespace and some punctuation.
+TOKEN = re.compile(r"[^\s(),.]+")
+
+# If the estimated difference is lower than this threshold
+# we treat both words as the same (declension, plural etc.)
+MAX_DELTA = 0.3
+
+# Below this many (token, synonym) pairs, the scalar path is faster than NumPy.
+BATCH_MIN_PAIRS = 256
+
+
+class SuffixAutomaton:
+    """
+    Automaton recognizing every substring of a text, built in linear time.
+    Used to find the longest common substring with another string in O(len(other)).
+    """
+
+    __slots__ = "length", "link", "next"
+
+    def __init__(self, text: str) -> None:
+        self.next: list[dict[str, int]] = [{}]
+        self.link: list[int] = [-1]
+        self.length: list[int] = [0]
+
+        last = 0
+        for ch in text:
+            cur = len(self.length)
+            self.next.append({})
+            self.length.append(self.length[last] + 1)
+            self.link.append(0)
+
+            p = last
+            while p != -1 and ch not in self.next[p]:
+                self.next[p][ch] = cur
+                p = self.link[p]
+            if p != -1:
+                q = self.next[p][ch]
+                if self.length[p] + 1 == self.length[q]:
+                    self.link[cur] = q
+                else:
+                    clone = len(self.length)
+                    self.next.append(dict(self.next[q]))
+                    self.length.append(self.length[p] + 1)
+                    self.link.append(self.link[q])
+                    while p != -1 and self.next[p].get(ch) == q:
+                        self.next[p][ch] = clone
+                        p = self.link[p]
+                    self.link[q] = clone
+                    self.link[cur] = clone
+            last = cur
+
+    def longest_common_substring(self, other: str) -> int:
+        state = 0
+        length = 0
+        best = 0
+        for ch in other:
+            while state and ch not in self.next[state]:
+                state = self.link[state]
+                length = self.length[state]
+            if ch in self.next[state]:
+                state = self.next[state][ch]
+                length += 1
+                best = max(best, length)
+        return best
 
 
 def LCS(a: str, b: str) -> int:
-    """Finds the longuest common substring of a and b"""
-    if a == b:
-        return len(a)
-    var = 0
-    while a:
-        i = 1
-        while True:
-            _buffer = a[:i]
-            if _buffer in b and i < len(a):
-                i += 1
-            else:
-                break
-        if i - 1 > var:
-            var = i - 1
-        a = a[i:]
-
-    return var
+    """Finds the length of the longest common substring of a and b"""
+    return SuffixAutomaton(a).longest_common_substring(b)
 
 
 def normalize_greek_word(word: str) -> str:
@@ -36,30 +97,184 @@ def normalize_greek_word(word: str) -> str:
     return "".join(c for c in normalized if not unicodedata.combining(c))
 
 
+def encode(words: list[str], pad: int) -> "np.ndarray":
+    """Encode words as a len(words) x max_length array of code points, right padded with pad."""
+    width = max(map(len, words), default=0) or 1
+    codes = np.full((len(words), width), pad, dtype=np.int32)
+    for idx, word in enumerate(words):
+        codes[idx, : len(word)] = np.frombuffer(word.encode("utf-32-le"), dtype=np.uint32)
+    return codes
+
+
+def lcs_matrix(a: "np.ndarray", b: "np.ndarray") -> "np.ndarray":
+    """
+    Length of the longest common substring of every pair of encoded words (cf. encode).
+    The paddings of a and b must differ, so that they never match.
+
+    The classic dynamic programming, one row of a at a time, for all pairs at once:
+    run[x, y, j + 1] is the length of the common suffix of a[x, :i + 1] and b[y, :j + 1].
+    """
+    # int16 halves the memory traffic: no word is 32767 characters long.
+    best = np.zeros((a.shape[0], b.shape[0], b.shape[1]), dtype=np.int16)
+    run = np.zeros((a.shape[0], b.shape[0], b.shape[1] + 1), dtype=np.int16)
+    for i in range(a.shape[1]):
+        equal = a[:, None, i, None] == b[None, :, :]
+        np.multiply(run[:, :, :-1] + 1, equal, out=run[:, :, 1:])
+        np.maximum(best, run[:, :, 1:], out=best)
+    return best.max(axis=2)
+
+
 def get_delta(a: str, b: str) -> float:
+    """1 = completely different, 0 = same word"""
     aa = normalize_greek_word(a)
     bb = normalize_greek_word(b)
 
     max_length = max(len(aa), len(bb))
-    m = max(LCS(aa, bb), LCS(bb, aa))
+    if max_length == 0:
+        return 0.0
+    m = LCS(aa, bb)
 
     return (max_length - m) / max_length
 
 
-def highlight_synonyms(sentence: str, synonyms: Set[str]) -> str:
-    for word in set(sentence.split()):
-        # Removes punctuation to match the correct words
-        word = re.sub(r"\(|\)|,|\.|", "", word)  # add ; ??
-        for reference in synonyms:
-            # 1 = same word, 0 = completely different
-            dif = get_delta(word, reference)
-            # If the estimated difference is lower than 0.25
-            # we treat both word as the same (declension, plural etc.)
-            if dif <= 0.3:
-                sentence = sentence.replace(word, f"**{word}**")
-                break
-
-    return sentence
+class Highlighter:
+    """
+    Highlights the words of sentences that are close to a set of synonyms.
+
+    The synonyms are normalized and indexed (one suffix automaton each) once,
+    and every sentence is then highlighted in a single pass over its tokens.
+
+    With an inflection index, the forms it knows are matched by lemma, and
+    only the unknown ones fall back to fuzzy matching.
+    """
+
+    def __init__(self, synonyms: Set[str], inflections: "InflectionIndex | None" = None) -> None:
+        self.normalized = {normalize_greek_word(synonym) for synonym in synonyms} - {""}
+        self.synonyms = [(len(normalized), SuffixAutomaton(normalized)) for normalized in self.normalized]
+        if np is not None:
+            ordered = list(self.normalized)
+            self.synonym_codes = encode(ordered, pad=-2)
+            self.synonym_lengths = np.array([len(synonym) for synonym in ordered], dtype=np.int32)
+
+        self.inflections = inflections
+        # The lemmas of the synonyms, as of self.version of the index.
+        self.lemmas: set[str] = set()
+        self.version = -1
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Recompute the lemmas of the synonyms if the inflection index changed."""
+        if self.inflections is None or self.version == self.inflections.version:
+            return
+        self.version = self.inflections.version
+        self.lemmas = set(self.normalized)
+        for synonym in self.normalized:
+            self.lemmas |= self.inflections.lookup(synonym)
+
+    def lookup(self, normalized: str) -> bool | None:
+        """Match a normalized word without fuzzy matching, or return None if it is unknown."""
+        if normalized in self.normalized:
+            return True
+
+        if self.inflections is not None:
+            lemmas = self.inflections.lookup(normalized)
+            if lemmas:
+                return normalized in self.lemmas or not lemmas.isdisjoint(self.lemmas)
+
+        return None
+
+    def matches(self, word: str) -> bool:
+        normalized = normalize_greek_word(word)
+        matched = self.lookup(normalized)
+        if matched is None:
+            matched = self.fuzzy_matches(normalized)
+        return matched
+
+    def fuzzy_matches(self, normalized: str) -> bool:
+        length = len(normalized)
+        for synonym_length, automaton in self.synonyms:
+            max_length = max(length, synonym_length)
+            # The common substring can not be longer than the shortest word.
+            if max_length - min(length, synonym_length) > MAX_DELTA * max_length:
+                continue
+            m = automaton.longest_common_substring(normalized)
+            if (max_length - m) / max_length <= MAX_DELTA:
+                return True
+        return False
+
+    def fuzzy_mask(self, words: list[str]) -> list[bool]:
+        """fuzzy_matches of every normalized word, scored all at once with NumPy if available."""
+        if np is None or len(words) * len(self.synonyms) < BATCH_MIN_PAIRS:
+            return [self.fuzzy_matches(word) for word in words]
+
+        lengths = np.array([len(word) for word in words], dtype=np.int32)
+        m = lcs_matrix(encode(words, pad=-1), self.synonym_codes)
+        max_length = np.maximum(lengths[:, None], self.synonym_lengths[None, :])
+        # Same expression (and float rounding) as fuzzy_matches.
+        close = (max_length - m) / max_length <= MAX_DELTA
+        return close.any(axis=1).tolist()
+
+    def masks(self, sentences: list[str]) -> list[list[bool]]:
+        """
+        Return, for every sentence, whether each of its tokens is to be highlighted.
+
+        Every distinct token is looked up once, and the ones that are left to
+        fuzzy matching are scored in a single batch.
+        """
+        self.refresh()
+        tokenized = [
+            [normalize_greek_word(word) for word in TOKEN.findall(sentence)] for sentence in sentences
+        ]
+
+        matched: dict[str, bool] = {}
+        unknown: list[str] = []
+        for tokens in tokenized:
+            for token in tokens:
+                if token not in matched:
+                    result = self.lookup(token)
+                    if result is None:
+                        unknown.append(token)
+                    matched[token] = bool(result)
+        matched.update(zip(unknown, self.fuzzy_mask(unknown)))
+
+        return [[matched[token] for token in tokens] for tokens in tokenized]
+
+    def highlight_all(self, sentences: list[str]) -> list[str]:
+        highlighted = []
+        for sentence, mask in zip(sentences, self.masks(sentences)):
+            parts = []
+            last = 0
+            for match, hit in zip(TOKEN.finditer(sentence), mask):
+                if hit:
+                    start, end = match.span()
+                    parts.append(sentence[last:start])
+                    parts.append(f"**{sentence[start:end]}**")
+                    last = end
+            parts.append(sentence[last:])
+            highlighted.append("".join(parts))
+        return highlighted
+
+    def highlight(self, sentence: str) -> str:
+        return self.highlight_all([sentence])[0]
+
+
+@functools.lru_cache(maxsize=256)
+def get_highlighter(synonyms: frozenset[str], inflections: "InflectionIndex | None" = None) -> Highlighter:
+    return Highlighter(synonyms, inflections)
+
+
+def highlight_synonyms(
+    sentence: str, synonyms: Set[str], inflections: "InflectionIndex | None" = None
+) -> str:
+    return get_highlighter(frozenset(synonyms), inflections).highlight(sentence)
+
+
+@timed("wordref.highlight_sentences")
+def highlight_sentences(
+    sentences: list[str], synonyms: Set[str], inflections: "InflectionIndex | None" = None
+) -> list[str]:
+    """Highlight the synonyms of several sentences at once (cf. Highlighter.masks)."""
+    return get_highlighter(frozenset(synonyms), inflections).highlight_all(sentences)
 
 
 if __name__ == "__main__":
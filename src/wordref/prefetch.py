@@ -0,0 +1,85 @@
+"""
+Background pool of validated random entries for the word of the day commands.
+
+A random Wordref page often fails Entry.is_valid_entry or is_valid_embed, so
+finding a good one can take several round trips. Instead of doing that while
+the user waits, a background task keeps a queue of embeds that already passed
+the checks, and refills it whenever it drops below a low-water mark.
+"""
+
+import asyncio
+
+from discord import Embed
+
+from ratelimit import BACKGROUND, set_priority
+from tracing import event, span
+from wordref.wordref import Wordref
+
+
+class RandomEntryPool:
+    def __init__(
+        self,
+        gr_en: bool,
+        hide_words: bool,
+        min_sentences_shown: int,
+        max_sentences_shown: int,
+        size: int = 8,
+        low_water: int = 3,
+        retry_delay: float = 5.0,
+    ) -> None:
+        self.gr_en = gr_en
+        self.hide_words = hide_words
+        self.min_sentences_shown = min_sentences_shown
+        self.max_sentences_shown = max_sentences_shown
+        self.low_water = low_water
+        # Wait time after an upstream error, to avoid hammering Wordref.
+        self.retry_delay = retry_delay
+
+        self.queue: asyncio.Queue[Embed] = asyncio.Queue(maxsize=size)
+        self.refill_needed = asyncio.Event()
+        self.refill_needed.set()
+
+    def new_wordref(self) -> Wordref:
+        return Wordref(None, self.gr_en, self.hide_words, self.min_sentences_shown, self.max_sentences_shown)
+
+    async def run(self) -> None:
+        """Refill the queue forever. Meant to be run as a background task."""
+        # The commands of the users go first (cf. ratelimit.py).
+        set_priority(BACKGROUND)
+        while True:
+            await self.refill_needed.wait()
+            # The root of the traces of the background fetches.
+            with span("prefetch.refill", gr_en=self.gr_en):
+                while not self.queue.full():
+                    try:
+                        embed = await self.new_wordref().try_fetch_embed()
+                    except Exception as e:
+                        event("prefetch.refill_failed", error=repr(e), retry_delay=self.retry_delay)
+                        await asyncio.sleep(self.retry_delay)
+                        continue
+                    if embed is not None:
+                        self.queue.put_nowait(embed)
+                event("prefetch.full", size=self.queue.qsize())
+            self.refill_needed.clear()
+
+    def take(self) -> Embed | None:
+        """Pop a prefetched embed without waiting, or return None if the pool is empty."""
+        try:
+            embed = self.queue.get_nowait()
+        except asyncio.QueueEmpty:
+            embed = None
+        if self.queue.qsize() < self.low_water:
+            self.refill_needed.set()
+        return embed
+
+    async def fetch_live(self) -> Embed | None:
+        """Fetch an embed while the user waits: up to several random pages, so defer the interaction first."""
+        event("prefetch.empty", gr_en=self.gr_en)
+        return await self.new_wordref().fetch_embed()
+
+    async def get(self) -> Embed | None:
+        """Pop a prefetched embed, falling back to a live fetch if the pool is empty."""
+        embed = self.take()
+        if embed is None:
+            embed = await self.fetch_live()
+        return embed
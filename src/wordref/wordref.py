@@ -1,12 +1,18 @@
 import re
-from typing import Any, List
+from typing import Any, Iterable, List
 
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from discord import Embed
 
-from utils import is_english
-from wordref.entry import Entry
+from cache import fetch_page, get_ttl
+from lexicon.lexicon import get_lexicon
+from lru import LRUCache
+from metrics import get_metrics, timed
+from singleflight import SingleFlight
+from tracing import event, span
+from utils import greeklish_to_greek_characters, is_english, parse_headword
+from wordref.entry import Entry, ParsedEntry
+from wordref.longest import normalize_greek_word
 
 ATTRIBUTES_EL = {
     "επίθ": "adj",
@@ -33,8 +39,54 @@ ATTRIBUTES_EN = {
     "vtr + prep",
     "vtr",
 }
-TAG = "\033[33mWORDREF:\033[0m"
-OK = "\033[32m[OK]\033[0m"
+try:
+    import lxml  # noqa: F401
+
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+# Everything we scrape lives in these tables.
+WRD_TABLES = SoupStrainer("table", {"class": "WRD"})
+
+
+# Parsed entries, keyed by (normalized query word, gr_en).
+# The rendering options (hide_words, min/max sentences) are applied on every hit.
+ENTRY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+entry_cache = LRUCache(max_bytes=ENTRY_CACHE_MAX_BYTES)
+# Concurrent misses of the entry cache, with the same key, fetch and parse once.
+entry_flight = SingleFlight("wordref")
+
+
+class AttributeStripper:
+    """
+    Strips every trailing attribute (and "+") of a Wordref text in one regex pass.
+
+    The attributes are matched as prefixes of the reversed text, so the regex is
+    anchored and only tried once, however many attributes there are.
+
+    >>> AttributeStripper({"ρ μ", "ρ αμ", "ουσ θηλ"}).strip("αγαπάω, αγαπώ ρ μ +")
+    'αγαπάω, αγαπώ'
+    """
+
+    def __init__(self, attributes: Iterable[str]) -> None:
+        self.attributes: set[str] = set()
+        self.add(*attributes)
+
+    def add(self, *attributes: str) -> None:
+        self.attributes.update(attributes)
+        # Longest first, so that f.e. "vtr + prep" wins over "vtr".
+        reversed_attributes = sorted((att[::-1] for att in self.attributes), key=len, reverse=True)
+        alternatives = "|".join(map(re.escape, reversed_attributes))
+        self.pattern = re.compile(rf"(?:\s|\+|{alternatives})*")
+
+    def strip(self, text: str) -> str:
+        end = self.pattern.match(text[::-1]).end()
+        return text[: len(text) - end].strip()
+
+
+STRIP_ATTRIBUTES_EL = AttributeStripper(ATTRIBUTES_EL)
+STRIP_ATTRIBUTES_EN = AttributeStripper(ATTRIBUTES_EN)
 
 
 def parse_words(text: str) -> List[str]:
@@ -43,19 +95,9 @@ def parse_words(text: str) -> List[str]:
     This extracts the word by deleting the attributes from a set list.
     """
 
-    attributes = ATTRIBUTES_EN if is_english(text) else ATTRIBUTES_EL
-
-    while True:
-        original_text = text
-        text = text.strip()
-        for att in attributes:
-            pattern = re.escape(att) + r"$"
-            text = re.sub(pattern, "", text)
-            text = re.sub(r"\+$", "", text)
-        if original_text == text:
-            break
+    stripper = STRIP_ATTRIBUTES_EN if is_english(text) else STRIP_ATTRIBUTES_EL
 
-    return text.split(", ")
+    return stripper.strip(text).split(", ")
 
 
 class Wordref:
@@ -95,48 +137,83 @@ class Wordref:
 
         self.max_random_iterations = 5
 
-    def fetch_embed(self) -> Embed | None:
+    async def fetch_embed(self) -> Embed | None:
         if not self.is_random:
-            embed = self.try_fetch_embed()
+            embed = await self.try_fetch_embed()
         else:
             embed = None
-            for _ in range(self.max_random_iterations):
-                embed = self.try_fetch_embed()
+            for iteration in range(self.max_random_iterations):
+                if iteration > 0:
+                    get_metrics().increment("retries", kind="wordref_random")
+                embed = await self.try_fetch_embed()
                 if embed is not None:
                     break
 
         return embed
 
-    def try_fetch_embed(self) -> Embed | None:
-        entry = self.try_fetch_entry()
+    async def try_fetch_embed(self) -> Embed | None:
+        entry = await self.try_fetch_entry()
 
-        if not entry.is_valid_entry:
-            return None
+        with span("wordref.validate"):
+            if not entry.is_valid_entry:
+                return None
 
-        print(f"{TAG} {OK} found a valid entry for {self.word=}.")
+        event("wordref.valid_entry", word=self.word)
         entry.add_embed()
 
         if not entry.is_valid_embed:
             return None
 
-        print(f"{TAG} {OK} found a valid embed for {self.word=}.")
+        event("wordref.valid_embed", word=self.word)
         return entry.embed
 
-    def try_fetch_entry(self) -> Entry:
-        response = requests.get(self.url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
+    async def try_fetch_entry(self) -> Entry:
+        # Random entries are never cached: we want a new word every time.
+        if self.is_random:
+            page = await fetch_page(self.url)
+            page.raise_for_status()
+            return self.parse_entry(page.text)
+
+        key = (normalize_greek_word(self.word), self.gr_en)
+        if (parsed := entry_cache.get(key)) is not None:
+            get_metrics().increment("entry_cache_requests", result="hit")
+            event("wordref.entry_cache_hit", word=self.word)
+            self.word = parsed.gr_word
+            return Entry.from_parsed(
+                parsed, self.hide_words, self.min_sentences_shown, self.max_sentences_shown, self.is_random
+            )
+
+        async def fetch_parsed() -> ParsedEntry:
+            page = await fetch_page(self.url)
+            page.raise_for_status()
+            entry = self.parse_entry(page.text)
+            parsed = entry.to_parsed()
+            # An invalid entry may come from a transient bad page: let the next lookup fetch it again.
+            # The valid ones expire with their page.
+            if entry.is_valid_entry:
+                entry_cache.put(key, parsed, ttl=get_ttl(self.url))
+            return parsed
+
+        get_metrics().increment("entry_cache_requests", result="miss")
+        parsed = await entry_flight.do(key, fetch_parsed)
+        self.word = parsed.gr_word
+        return Entry.from_parsed(
+            parsed, self.hide_words, self.min_sentences_shown, self.max_sentences_shown, self.is_random
+        )
+
+    @timed("wordref.parse_entry")
+    def parse_entry(self, html: str, parse_only: SoupStrainer | None = WRD_TABLES) -> Entry:
+        """
+        Only the WRD tables are materialized (cf. parse_only), the rest of the
+        page (scripts, navigation, forum links...) is skipped by the parser.
+        """
+        soup = BeautifulSoup(html, PARSER, parse_only=parse_only)
 
         # Account for the query word being written without accents by scraping the accented word.
-        try:
-            self.word = (
-                soup.find("table", {"class": "WRD"})
-                .find("tr", {"class": "even"})
-                .find("td", {"class": "FrWrd"})
-                .strong.text.split()[0]
-            )
-        except:
-            pass
+        if headword := parse_headword(soup):
+            self.word = headword
+            if not is_english(headword):
+                get_lexicon().learn(headword.strip(","))
 
         link = f"{Wordref.wordref_url}/gren/{self.word}"  # Forced "gren"
 
@@ -150,47 +227,73 @@ class Wordref:
             self.is_random,
         )
 
-        print(f"{TAG} requesting {self.url}")
-        print(f"{TAG} trying to fetch '{self.word=}' ({link})")
-        # print(f"{TAG}\n{entry}")
+        event("wordref.parse", url=self.url, word=self.word, link=link)
 
         for res in soup.find_all("table", {"class": "WRD"}):
-            self.try_fetch_word(res, entry)
-            self.try_fetch_sentence_pairs(res, entry)
+            self.try_fetch_table(res, entry)
 
         return entry
 
-    def try_fetch_word(self, res: Any, entry: Entry) -> None:
+    def try_fetch_table(self, res: Any, entry: Entry) -> None:
+        """Walk the rows of a WRD table once, classifying them as word or example rows."""
+        gr_sentence = ""
+        en_sentence = ""
         for item in res.find_all("tr", {"class": ["even", "odd"]}):
-            FrWrd = item.find("td", {"class": "FrWrd"})
-            ToWrd = item.find("td", {"class": "ToWrd"})
-
-            if not FrWrd or not ToWrd:
-                continue
+            cells: dict[str, Any] = {}
+            for cell in item.find_all("td", recursive=False):
+                for cls in cell.get("class", ()):
+                    cells.setdefault(cls, cell)
 
-            en_text = ToWrd.text
-            gr_text = FrWrd.text
+            # Word row
+            FrWrd = cells.get("FrWrd")
+            ToWrd = cells.get("ToWrd")
+            if FrWrd and ToWrd:
+                self.try_fetch_word(FrWrd.text, ToWrd.text, entry)
 
-            if is_english(FrWrd.text):
-                en_text, gr_text = gr_text, en_text
+            # Example rows
+            FrEx = cells.get("FrEx")
+            ToEx = cells.get("ToEx")
 
-            if not entry.en_word:
-                entry.en_word = en_text.strip()
-
-            # Parts of speech
-            if (entry.gr_pos is None) and entry.gr_word:
-                if len(gr_text.split()) > 1 and entry.gr_word in gr_text:
-                    entry.gr_pos = gr_text.replace(entry.gr_word, "").strip()
-                    if "," in entry.gr_pos:
-                        entry.gr_pos = ""
+            # Resets buffered sentences
+            if not FrEx and not ToEx:
+                en_sentence = ""
+                gr_sentence = ""
 
-            # Synonyms
-            for word in parse_words(gr_text):
-                entry.gr_synonyms.add(word)
-            for word in parse_words(en_text):
-                entry.en_synonyms.add(word)
+            # Buffers sentences to then group them in pairs
+            if FrEx:
+                en_sentence = FrEx.text
+            if ToEx:
+                gr_sentence = ToEx.text
+                # Delete "Translation not found" message
+                if "Αυτή η πρόταση δεν είναι μετάφραση της αγγλικής πρότασης." in gr_sentence:
+                    gr_sentence = ""
 
-    def try_fetch_sentence_pairs(self, res: Any, entry: Entry) -> None:
+            # Groups them in pairs
+            if gr_sentence and en_sentence:
+                self.try_fetch_sentence_pair(gr_sentence, en_sentence, entry)
+
+    def try_fetch_word(self, gr_text: str, en_text: str, entry: Entry) -> None:
+        # The column order depends on the dictionary (gren or engr).
+        if is_english(gr_text):
+            en_text, gr_text = gr_text, en_text
+
+        if not entry.en_word:
+            entry.en_word = en_text.strip()
+
+        # Parts of speech
+        if (entry.gr_pos is None) and entry.gr_word:
+            if len(gr_text.split()) > 1 and entry.gr_word in gr_text:
+                entry.gr_pos = gr_text.replace(entry.gr_word, "").strip()
+                if "," in entry.gr_pos:
+                    entry.gr_pos = ""
+
+        # Synonyms
+        for word in parse_words(gr_text):
+            entry.gr_synonyms.add(word)
+        for word in parse_words(en_text):
+            entry.en_synonyms.add(word)
+
+    def try_fetch_sentence_pair(self, gr_sentence: str, en_sentence: str, entry: Entry) -> None:
         """
         Options:
         - (1) Stores every pair (even when there are
@@ -203,55 +306,59 @@ class Wordref:
         - (2) Store only one pair giving priority to containing the original word.
         """
 
-        gr_sentence = ""
-        en_sentence = ""
-        for item in res.find_all("tr", {"class": ["even", "odd"]}):
-            FrEx = item.find("td", {"class": "FrEx"})
-            ToEx = item.find("td", {"class": "ToEx"})
+        # Option 1
+        # entry.sentences[(gr_sentence, en_sentence)] = (gr_sentence, en_sentence)
+
+        # Option 2
+        # Pairs are indexed by their pivot sentence (the english one if gr_en),
+        # so finding the stored translation of a sentence is a dict lookup.
+        pivot = en_sentence if self.gr_en else gr_sentence
+        if (stored_pair := entry.sentences.get(pivot)) is not None:
+            stored_greek, stored_english = stored_pair
+            # Our stored answer is already fine
+            # (we want our translations containing "word").
+            stored_translation = stored_greek if self.gr_en else stored_english
+            if self.word and self.word in stored_translation:
+                return
+
+        entry.sentences[pivot] = (gr_sentence, en_sentence)
+
+
+async def fetch_embed_fixing_spelling(
+    word: str,
+    gr_en: bool,
+    hide_words: bool,
+    min_sentences_shown: int,
+    max_sentences_shown: int,
+) -> Embed | None:
+    """
+    Search word, and in case of failure, search it again with fixed spelling.
 
-            # Resets buffered sentences
-            if not FrEx and not ToEx:
-                en_sentence = ""
-                gr_sentence = ""
+    The greek page of a greeklish / unaccented word already contains both the
+    accented headword and its entry, so the spelling is resolved from the same
+    parsed page as the entry (cf. fix_greek_spelling). A second request for the
+    headword is only sent when it actually differs from the word we searched.
+    """
+    options = (gr_en, hide_words, min_sentences_shown, max_sentences_shown)
 
-            # Buffers sentences to then group them in pairs
-            if FrEx:
-                en_sentence = FrEx.text
-            if ToEx:
-                gr_sentence = ToEx.text
-                # Delete "Translation not found" message
-                if "Αυτή η πρόταση δεν είναι μετάφραση της αγγλικής πρότασης." in gr_sentence:
-                    gr_sentence = ""
+    wordref = Wordref(word, *options)
+    embed = await wordref.fetch_embed()
+    if embed is not None:
+        return embed
 
-            # Groups them in pairs
-            if gr_sentence and en_sentence:
-                # Option 1
-                # entry.sentences.add((gr_sentence, en_sentence))
-
-                # Option 2
-                stored_already = False
-                for stored_pair in entry.sentences:
-                    stored_greek, stored_english = stored_pair
-                    if self.gr_en is True:
-                        if stored_english == en_sentence:
-                            stored_already = True
-                            # Our stored answer is already fine
-                            if self.word and self.word in stored_greek:
-                                break
-                            else:
-                                entry.sentences.remove((stored_greek, stored_english))
-                                entry.sentences.add((gr_sentence, en_sentence))
-                                break
-                    # We want our english sentences containing "word"
-                    else:
-                        if stored_greek == gr_sentence:
-                            stored_already = True
-                            # Our stored answer is already fine
-                            if self.word and self.word in stored_english:
-                                break
-                            else:
-                                entry.sentences.remove((stored_greek, stored_english))
-                                entry.sentences.add((gr_sentence, en_sentence))
-                                break
-                if not stored_already:
-                    entry.sentences.add((gr_sentence, en_sentence))
+    # Greeklish words were searched in the english dictionary: try the greek one.
+    greek_word = greeklish_to_greek_characters(word)
+    if normalize_greek_word(greek_word) != normalize_greek_word(word):
+        wordref = Wordref(greek_word, *options)
+        embed = await wordref.fetch_embed()
+        if embed is not None:
+            event("wordref.converted", word=word, to=wordref.word)
+            return embed
+
+    # The headword was scraped while parsing the page of the last lookup.
+    headword = wordref.word.strip(",")
+    if normalize_greek_word(headword) == normalize_greek_word(greek_word):
+        return None
+
+    event("wordref.converted", word=word, to=headword)
+    return await Wordref(headword, *options).fetch_embed()
@@ -0,0 +1,160 @@
+"""
+Bounded pool of background workers for the slow commands.
+
+Discord only waits 3 seconds for the first response to an interaction, while
+a command fetching several upstream pages can take longer on a slow day. So
+these commands defer the interaction right away, and submit the actual work
+to this pool, which delivers the result with a followup (valid 15 minutes).
+
+Every command has a latency budget: past it, the work is cancelled and the
+user is told so. Queue wait, duration and outcome are recorded in metrics.py.
+
+Example usage:
+    await interaction.response.defer(thinking=True)
+    await get_worker_pool().submit("conj", work, on_failure)
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Mapping
+
+from metrics import get_metrics
+from tracing import event, span
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 64
+# Seconds, overridden by COMMAND_BUDGET (all commands) and COMMAND_BUDGET_<COMMAND> in .env
+DEFAULT_BUDGET = 20.0
+DEFAULT_BUDGETS = {
+    # Up to three conjugation pages, plus a Wordref request to fix the spelling.
+    "conj": 30.0,
+}
+
+
+def budgets_from_config(config: Mapping[str, str | None]) -> tuple[float, dict[str, float]]:
+    """
+    Return the default and per command budgets from the .env values.
+
+    >>> budgets_from_config({"COMMAND_BUDGET": "10", "COMMAND_BUDGET_FORVO": "5"})
+    (10.0, {'conj': 30.0, 'forvo': 5.0})
+    """
+    default_budget = float(config.get("COMMAND_BUDGET") or DEFAULT_BUDGET)
+    budgets = dict(DEFAULT_BUDGETS)
+    for key, value in config.items():
+        if key.startswith("COMMAND_BUDGET_") and value:
+            budgets[key.removeprefix("COMMAND_BUDGET_").lower()] = float(value)
+    return default_budget, budgets
+
+
+@dataclass
+class Job:
+    command: str
+    work: Callable[[], Awaitable[None]]
+    # Called with a message for the user if the work fails or runs out of budget.
+    on_failure: Callable[[str], Awaitable[None]]
+    submitted: float = field(default_factory=time.perf_counter)
+
+
+class WorkerPool:
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        default_budget: float = DEFAULT_BUDGET,
+        budgets: dict[str, float] | None = None,
+    ) -> None:
+        self.workers = workers
+        self.default_budget = default_budget
+        self.budgets = DEFAULT_BUDGETS if budgets is None else budgets
+        # Bounded: when every worker is busy and the queue is full, submit waits.
+        self.queue: asyncio.Queue[Job] = asyncio.Queue(maxsize=queue_size)
+        self.tasks: list[asyncio.Task] = []
+
+    def budget(self, command: str) -> float:
+        return self.budgets.get(command, self.default_budget)
+
+    def start(self) -> list[asyncio.Task]:
+        """Start the workers, in the running event loop."""
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self.run()) for _ in range(self.workers)]
+        return self.tasks
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def submit(
+        self,
+        command: str,
+        work: Callable[[], Awaitable[None]],
+        on_failure: Callable[[str], Awaitable[None]],
+    ) -> None:
+        self.start()
+        await self.queue.put(Job(command, work, on_failure))
+
+    async def join(self) -> None:
+        """Wait until every submitted job is done."""
+        await self.queue.join()
+
+    async def run(self) -> None:
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.run_job(job)
+            finally:
+                self.queue.task_done()
+
+    async def run_job(self, job: Job) -> None:
+        metrics = get_metrics()
+        start = time.perf_counter()
+        metrics.observe("queue_wait_seconds", start - job.submitted, command=job.command)
+        budget = self.budget(job.command)
+
+        with span("command", command=job.command, budget=budget, queue_wait=start - job.submitted) as command:
+            message = None
+            try:
+                await asyncio.wait_for(job.work(), budget)
+                outcome = "ok"
+            except TimeoutError:
+                outcome = "timeout"
+                message = "The command timed out, try again later."
+                event("worker.timeout", budget=budget)
+            except Exception as e:
+                outcome = "error"
+                message = "The command did not succeed."
+                command.error = repr(e)
+                event("worker.failed", error=repr(e))
+            command.set(outcome=outcome)
+
+            # Measured from the submission: that is what the user waits for.
+            metrics.observe("command_seconds", time.perf_counter() - job.submitted, command=job.command)
+            metrics.increment("commands", command=job.command, outcome=outcome)
+
+            if message is not None:
+                try:
+                    await job.on_failure(message)
+                except Exception as e:
+                    event("worker.report_failed", error=repr(e))
+
+
+_worker_pool: WorkerPool | None = None
+
+
+def configure_worker_pool(
+    workers: int = DEFAULT_WORKERS,
+    default_budget: float = DEFAULT_BUDGET,
+    budgets: dict[str, float] | None = None,
+) -> WorkerPool:
+    global _worker_pool
+
+    _worker_pool = WorkerPool(workers, default_budget=default_budget, budgets=budgets)
+    return _worker_pool
+
+
+def get_worker_pool() -> WorkerPool:
+    if _worker_pool is None:
+        return configure_worker_pool()
+    return _worker_pool
@@ -0,0 +1,72 @@
+import os
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+
+import cache
+import lexicon.inflections
+import lexicon.lexicon
+from replay import Cassette, StubServer
+from session import close_session
+
+CASSETTE = Path(__file__).parent / "cassettes" / "upstream.json"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def upstream():
+    """
+    Where the pages of Wordref, Wiktionary and Forvo come from, set by REPLAY:
+        replay (default): the cassette, served by a local stub server
+        record: the real upstreams, adding every response to the cassette
+        off: the real upstreams
+    """
+    mode = os.environ.get("REPLAY", "replay")
+    cassette = Cassette(CASSETTE)
+    if mode == "replay":
+        server = StubServer(cassette)
+        server.start()
+        cache.configure_upstream(upstream_url=server.upstream_url)
+        yield server
+        server.stop()
+    elif mode == "record":
+        cache.configure_upstream(on_response=cassette.record)
+        yield None
+        cassette.save()
+    else:
+        yield None
+    cache.configure_upstream()
+
+
+@pytest.fixture(autouse=True)
+def replayed_only(upstream):
+    """Fail the tests requesting pages that are not in the cassette, instead of a confusing 404."""
+    if upstream is None:
+        yield
+        return
+    upstream.misses.clear()
+    yield
+    assert not upstream.misses, f"Not in the cassette: {upstream.misses}. Record them with REPLAY=record."
+
+
+@pytest.fixture(autouse=True)
+def page_cache(tmp_path):
+    """Keep the page cache (and the learned indexes) of every test in a temporary file."""
+    path = str(tmp_path / "cache.sqlite3")
+    page_cache = cache.configure_page_cache(path)
+    lexicon.lexicon.configure_lexicon(path)
+    lexicon.inflections.configure_inflections(path)
+    yield page_cache
+    page_cache.close()
+    lexicon.lexicon.get_lexicon().close()
+    lexicon.inflections.get_inflections().close()
+    cache._page_cache = None
+    lexicon.lexicon._lexicon = None
+    lexicon.inflections._inflections = None
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def sessions():
+    """Close the pooled sessions in the event loop of the test that opened them."""
+    yield
+    await close_session()
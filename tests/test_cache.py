@@ -0,0 +1,87 @@
+import time
+
+import pytest
+from aiohttp import web
+
+from cache import ACCESS_RESOLUTION, PageCache, fetch_page, normalize_url
+from metrics import get_metrics
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+def test_normalize_url():
+    urls = [
+        "https://www.wordreference.com/gren/χαρά",
+        "HTTPS://WWW.wordreference.com/gren/%CF%87%CE%B1%CF%81%CE%AC",
+        "https://www.wordreference.com/gren/χαρά#anchor",
+        "https://www.wordreference.com/gren/χαρά",  # decomposed accent
+    ]
+    assert len({normalize_url(url) for url in urls}) == 1
+
+
+def test_eviction(tmp_path, monkeypatch):
+    page_cache = PageCache(str(tmp_path / "cache.sqlite3"), max_bytes=450)
+    for idx in range(5):
+        page_cache.put(f"url{idx}", b"x" * 100, None, None, ttl=60)
+    now = time.time()
+    changes = page_cache.connection.total_changes
+    # Within ACCESS_RESOLUTION of its last access, a hit writes nothing.
+    page_cache.get("url2")
+    assert page_cache.connection.total_changes == changes
+    monkeypatch.setattr(time, "time", lambda: now + 2 * ACCESS_RESOLUTION)
+    page_cache.get("url2")  # Makes url2 the most recently used.
+    assert page_cache.connection.total_changes == changes + 1
+    page_cache.put("url5", b"x" * 100, None, None, ttl=60)
+
+    assert page_cache.total_bytes <= 450
+    assert page_cache.get("url2") is not None
+    assert page_cache.get("url5") is not None
+    assert page_cache.get("url0") is None
+    assert page_cache.get("url1") is None
+
+    # A large page evicts every older page it needs room from, in one go.
+    page_cache.put("large", b"x" * 300, None, None, ttl=60)
+    assert len(page_cache) == 2
+    assert page_cache.get("url5") is not None
+    size = page_cache.connection.execute("SELECT SUM(size) FROM pages").fetchone()[0]
+    assert page_cache.total_bytes == size == 400
+
+
+@pytest.mark.asyncio()
+async def test_fetch_page_revalidation(page_cache, monkeypatch):
+    hits = {"count": 0}
+
+    async def handler(request: web.Request) -> web.Response:
+        hits["count"] += 1
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(body="<html>χαρά</html>".encode(), headers={"ETag": '"v1"'})
+
+    app = web.Application()
+    app.router.add_get("/{word}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    url = f"http://127.0.0.1:{port}/χαρά"
+
+    try:
+        page = await fetch_page(url)
+        assert page.status == 200 and not page.from_cache
+        assert page.text == "<html>χαρά</html>"
+
+        # Fresh: served from the cache without a request.
+        page = await fetch_page(url)
+        assert page.from_cache and hits["count"] == 1
+
+        # Stale: revalidated with the ETag, the server answers 304.
+        monkeypatch.setattr(time, "time", lambda: 2**40)
+        host = f"127.0.0.1:{port}"
+        not_modified = get_metrics().count("upstream_responses", host=host, status="304")
+        page = await fetch_page(url)
+        assert page.from_cache and hits["count"] == 2
+        assert get_metrics().count("upstream_responses", host=host, status="304") == not_modified + 1
+        assert page.text == "<html>χαρά</html>"
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,33 @@
+from lexicon.greeklish import greeklish_candidates, transliterate
+from lexicon.lexicon import get_lexicon
+
+
+def test_greeklish_digraphs():
+    fixture = {
+        "thalassa": "θαλασσα",
+        "psari": "ψαρι",
+        "ksenodoxeio": "ξενοδοχειο",
+        "mpanio": "μπανιο",
+        "pou": "που",
+        "dromos": "δρομος",
+    }
+    for greeklish, greek in fixture.items():
+        assert greeklish_candidates(greeklish)[0] == greek, greeklish
+
+
+def test_greeklish_greek_is_kept():
+    assert greeklish_candidates("ευχαριστω") == ["ευχαριστω"]
+
+
+def test_greeklish_lexicon():
+    lexicon = get_lexicon()
+    # The best candidate is not a word, but a lower ranked one is.
+    fixture = {
+        "psomi": "ψωμι",
+        "kalimera": "καλημερα",
+        "efxaristo": "ευχαριστω",
+        "thelo": "θελω",
+    }
+    for greeklish, greek in fixture.items():
+        assert greeklish_candidates(greeklish)[0] != greek
+        assert transliterate(greeklish, lexicon) == greek, greeklish
@@ -0,0 +1,85 @@
+from cache import normalize_url
+from lexicon.inflections import InflectionIndex, get_inflections
+from wiktionary.wiktionary import WiktionaryQuery, index_inflections, index_page_cache
+from wordref.longest import highlight_synonyms
+
+DECLENSION_HTML = """
+<div class="mw-content-ltr mw-parser-output">
+<table>
+<tr><th>πτώσεις</th><th>ενικός</th><th>πληθυντικός</th></tr>
+<tr><th>ονομαστική</th><td>το τραπέζι</td><td>τα τραπέζια</td></tr>
+<tr><th>γενική</th><td>του τραπεζιού</td><td>των τραπεζιών</td></tr>
+<tr><th>αιτιατική</th><td>το τραπέζι</td><td>τα τραπέζια</td></tr>
+<tr><th>κλητική</th><td>τραπέζι</td><td>τραπέζια</td></tr>
+</table>
+</div>
+"""
+
+# Table structure two (cf. _parse_conjugation_table_two)
+CONJUGATION_HTML = """
+<div class="mw-content-ltr mw-parser-output">
+<div class="mw-heading mw-heading4"><h4 id="Κλίση">Κλίση</h4></div>
+<table>
+<tr><th>πρόσωπα</th><th>Ενεστώτας</th><th>Παρατατικός</th></tr>
+<tr><td>εγώ</td><td>ξέρω</td><td>ήξερα</td></tr>
+<tr><td>εσύ</td><td>ξέρεις</td><td>ήξερες</td></tr>
+<tr><td>αυτός</td><td>ξέρει</td><td>ήξερε</td></tr>
+<tr><td>εμείς</td><td>ξέρουμε<br>ξέρομε</td><td>ξέραμε</td></tr>
+<tr><td>εσείς</td><td>ξέρετε</td><td>ξέρατε</td></tr>
+<tr><td>αυτοί</td><td>ξέρουν(ε)</td><td>ήξεραν</td></tr>
+</table>
+</div>
+"""
+
+
+def test_inflection_index(tmp_path):
+    path = str(tmp_path / "inflections.sqlite3")
+    inflections = InflectionIndex(path)
+    assert inflections.learn("αγαπώ", ["αγάπησα", "θα αγαπήσω", "αγαπάω / αγαπώ", "-"]) == 4
+    assert inflections.learn("αγαπώ", ["αγάπησα"]) == 0
+    inflections.close()
+
+    # Learned forms survive restarts.
+    inflections = InflectionIndex(path)
+    assert inflections.lookup("Αγάπησα") == {"αγαπω"}
+    assert inflections.lookup("αγαπήσω") == {"αγαπω"}
+    assert inflections.lookup("αγαπάω") == {"αγαπω"}
+    assert inflections.lookup("θα") == set()
+    assert "-" not in inflections
+
+
+def test_index_wiktionary_tables(page_cache):
+    index_inflections(WiktionaryQuery.from_html("τραπέζι", "greek", DECLENSION_HTML))
+    inflections = get_inflections()
+    assert inflections.lookup("τραπεζιών") == {"τραπεζι"}
+    # The articles and the case names are not forms.
+    assert "του" not in inflections
+    assert "γενική" not in inflections
+
+    # Conjugation tables are indexed when parsed, here from the page cache.
+    url = normalize_url("https://el.wiktionary.org/wiki/ξέρω")
+    page_cache.put(url, CONJUGATION_HTML.encode(), None, None, ttl=60)
+    index_page_cache(page_cache)
+    assert inflections.lookup("ήξεραν") == {"ξερω"}
+    assert inflections.lookup("ξέρομε") == {"ξερω"}
+    # The pronouns are not forms.
+    assert "εσύ" not in inflections
+
+
+def test_highlight_with_inflections():
+    inflections = get_inflections()
+    inflections.learn("αγαπώ", ["αγαπάω / αγαπώ", "αγάπησε", "αγαπούσαν"])
+
+    sentence = "Τον αγάπησε και τον αγαπούσαν."
+    assert highlight_synonyms(sentence, {"αγαπάω"}, inflections) == "Τον **αγάπησε** και τον **αγαπούσαν**."
+
+    # Known forms are matched by lemma, which fuzzy matching gets wrong both ways.
+    sentence = "Το ήξερα ότι το ψωμί ήταν ξερό."
+    assert highlight_synonyms(sentence, {"ξέρω"}, inflections) == "Το ήξερα ότι το ψωμί ήταν **ξερό**."
+    inflections.learn("ξερός", ["ξερό"])
+    inflections.learn("ξέρω", ["ήξερα"])
+    # The cached highlighters also see the forms learned since they were built.
+    assert highlight_synonyms(sentence, {"ξέρω"}, inflections) == "Το **ήξερα** ότι το ψωμί ήταν ξερό."
+
+    # Unknown forms fall back to fuzzy matching.
+    assert highlight_synonyms("Ημερήσια εφημερίδα.", {"ημερήσιος"}, inflections) == "**Ημερήσια** εφημερίδα."
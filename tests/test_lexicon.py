@@ -0,0 +1,45 @@
+import pytest
+
+from cache import Page
+from lexicon.lexicon import Lexicon, get_lexicon
+from utils import fix_greek_spelling
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+def test_lexicon_lookup(tmp_path):
+    lexicon = Lexicon(str(tmp_path / "lexicon.sqlite3"))
+    assert lexicon.lookup("χαρα") == "χαρά"
+    assert lexicon.lookup("ΧΑΡΑ") == "χαρά"
+    assert lexicon.lookup("χαρά") == "χαρά"
+    assert lexicon.lookup("μπλαμπλα") is None
+
+
+def test_lexicon_learn(tmp_path):
+    path = str(tmp_path / "lexicon.sqlite3")
+    lexicon = Lexicon(path)
+    lexicon.learn("πότε")
+    lexicon.learn("ποτέ")
+    lexicon.learn("αγγούρι")
+    lexicon.close()
+
+    # Learned words survive restarts.
+    lexicon = Lexicon(path)
+    assert lexicon.learned == 3
+    assert lexicon.lookup("αγγουρι") == "αγγούρι"
+    # Ambiguous words are left to Wordref.
+    assert lexicon.lookup("ποτε") is None
+
+
+@pytest.mark.asyncio()
+async def test_fix_greek_spelling_offline(monkeypatch):
+    async def fake_fetch_page(url: str) -> Page:
+        assert False, f"Unexpected request: {url}"
+
+    monkeypatch.setattr("utils.fetch_page", fake_fetch_page)
+    assert await fix_greek_spelling("xara") == "χαρά"
+    assert await fix_greek_spelling("χαρα") == "χαρά"
+    assert await fix_greek_spelling("ευχαριστω") == "ευχαριστώ"
+
+    get_lexicon().learn("αγγούρι")
+    assert await fix_greek_spelling("αγγουρι") == "αγγούρι"
@@ -1,9 +1,50 @@
 import itertools
+import random
 
-from wordref.longest import get_delta
+import pytest
+
+import wordref.longest
+from wordref.longest import LCS, Highlighter, get_delta, highlight_sentences, highlight_synonyms
 
 
 def test_longest():
     words = ["Άλφα", "Αλφα", "άλφα", "αλφα"]
     for w1, w2 in itertools.combinations(words, 2):
         assert get_delta(w1, w2) == 0
+
+
+def test_lcs():
+    assert LCS("ημερησιος", "ημερησια") == 7
+    assert LCS("abcxyz", "xyzabc") == 3
+    assert LCS("abc", "") == 0
+
+
+def test_highlight_synonyms():
+    synonyms = {"daily", "ημερήσιος"}
+    sentence = "The daily newspaper (ημερήσια εφημερίδα, daily.) is delivered every day."
+    expected = "The **daily** newspaper (**ημερήσια** εφημερίδα, **daily**.) is delivered every day."
+    assert highlight_synonyms(sentence, synonyms) == expected
+
+    # Only whole words are highlighted, never a part of another word.
+    assert highlight_synonyms("One day, today.", {"day"}) == "One **day**, today."
+
+
+def test_highlight_sentences():
+    sentences = ["The daily newspaper.", "One day, today."]
+    assert highlight_sentences(sentences, {"daily", "day"}) == [
+        highlight_synonyms(sentence, {"daily", "day"}) for sentence in sentences
+    ]
+
+
+def test_batched_fuzzy_matching(monkeypatch):
+    pytest.importorskip("numpy")
+    rng = random.Random(0)
+
+    def random_word() -> str:
+        return "".join(rng.choice("αβγδεά") for _ in range(rng.randint(1, 10)))
+
+    highlighter = Highlighter({random_word() for _ in range(20)})
+    words = list({random_word() for _ in range(200)})
+    monkeypatch.setattr(wordref.longest, "BATCH_MIN_PAIRS", 0)
+    # Same threshold semantics as the scalar path.
+    assert highlighter.fuzzy_mask(words) == [highlighter.fuzzy_matches(word) for word in words]
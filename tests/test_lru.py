@@ -0,0 +1,43 @@
+import time
+
+from lru import LRUCache
+
+
+def test_lru_eviction():
+    cache = LRUCache(max_bytes=300, sizeof=lambda value: 100)
+    for key in "abc":
+        cache.put(key, key)
+    cache.get("a")  # Makes "a" the most recently used.
+    cache.put("d", "d")
+
+    assert len(cache) == 3
+    assert cache.total_bytes == 300
+    assert "b" not in cache
+    assert all(key in cache for key in "acd")
+
+
+def test_lru_counters():
+    cache = LRUCache(max_bytes=1024)
+    cache.put("a", "alpha")
+    assert cache.get("a") == "alpha"
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_ratio == 0.5
+
+
+def test_lru_oversized_value():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.put("a", "x" * 11)
+    assert "a" not in cache
+
+
+def test_lru_ttl(monkeypatch):
+    cache = LRUCache(max_bytes=300, sizeof=lambda value: 100)
+    cache.put("a", "a", ttl=60)
+    cache.put("b", "b")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "b"
+    assert cache.total_bytes == 100
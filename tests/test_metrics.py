@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientSession
+
+from metrics import Metrics, get_metrics, monitor_loop_lag, start_metrics_server, timed
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+def test_quantile():
+    metrics = Metrics()
+    assert metrics.quantile("stage_seconds", 0.5, stage="test") is None
+    for value in [4.0, 1.0, 3.0, 2.0, 5.0]:
+        metrics.observe("stage_seconds", value, stage="test")
+
+    assert metrics.quantile("stage_seconds", 0.0, stage="test") == 1.0
+    assert metrics.quantile("stage_seconds", 0.5, stage="test") == 3.0
+    assert metrics.quantile("stage_seconds", 0.95, stage="test") == pytest.approx(4.8)
+    assert metrics.quantile("stage_seconds", 1.0, stage="test") == 5.0
+
+
+def test_render():
+    metrics = Metrics()
+    metrics.increment("retries", kind="forvo_403")
+    metrics.increment("retries", 2, kind="forvo_403")
+    metrics.set("ratelimit_queue_depth", 3, host="forvo.com")
+    for value in [0.003, 0.003, 0.2, 100]:
+        metrics.observe("upstream_seconds", value, host='say "hi"')
+
+    lines = metrics.render().splitlines()
+    assert "# TYPE rbot_retries_total counter" in lines
+    assert 'rbot_retries_total{kind="forvo_403"} 3' in lines
+    assert 'rbot_ratelimit_queue_depth{host="forvo.com"} 3' in lines
+    assert "# TYPE rbot_upstream_seconds histogram" in lines
+    # Cumulative buckets, labels escaped.
+    assert 'rbot_upstream_seconds_bucket{host="say \\"hi\\"",le="0.0025"} 0' in lines
+    assert 'rbot_upstream_seconds_bucket{host="say \\"hi\\"",le="0.005"} 2' in lines
+    assert 'rbot_upstream_seconds_bucket{host="say \\"hi\\"",le="60"} 3' in lines
+    assert 'rbot_upstream_seconds_bucket{host="say \\"hi\\"",le="+Inf"} 4' in lines
+    assert 'rbot_upstream_seconds_count{host="say \\"hi\\""} 4' in lines
+
+
+@pytest.mark.asyncio()
+async def test_metrics_server():
+    @timed("test.stage")
+    def stage() -> int:
+        return 1
+
+    assert stage() == 1
+    lag = asyncio.create_task(monitor_loop_lag(interval=0.001))
+    await asyncio.sleep(0.01)
+    lag.cancel()
+
+    runner = await start_metrics_server(port=0)
+    try:
+        host, port = runner.addresses[0][:2]
+        async with ClientSession() as session:
+            async with session.get(f"http://{host}:{port}/metrics") as response:
+                assert response.status == 200
+                text = await response.text()
+    finally:
+        await runner.cleanup()
+
+    assert 'rbot_stage_seconds_count{stage="test.stage"}' in text
+    assert "rbot_event_loop_lag_seconds_count" in text
+    assert get_metrics().quantile("stage_seconds", 0.5, stage="test.stage") is not None
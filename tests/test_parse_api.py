@@ -0,0 +1,129 @@
+import json
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from metrics import get_metrics
+from replay import Cassette
+from wiktionary.parse_api import configure_parse_api
+from wiktionary.wiktionary import fetch_conjugation, fetch_wiktionary_pos
+
+pytest_plugins = ("pytest_asyncio",)
+
+CASSETTE = Path(__file__).parent / "cassettes" / "upstream.json"
+
+HEADING_RE = re.compile(rb'<div class="mw-heading mw-heading(\d)"><h\d id="([^"]+)"')
+
+
+def parse_sections(html: bytes) -> list[tuple[int, str, int]]:
+    """The (level, anchor, offset) of the headings of a recorded page."""
+    return [(int(m.group(1)), m.group(2).decode(), m.start()) for m in HEADING_RE.finditer(html)]
+
+
+class StubApi:
+    """The action=parse API of Wiktionary, answered from the recorded pages of the cassette."""
+
+    def __init__(self) -> None:
+        self.cassette = Cassette(CASSETTE)
+        self.requests: list[dict[str, str]] = []
+
+    def page(self, lcode: str, title: str) -> bytes | None:
+        for suffix in ("", "?printable=yes"):
+            recorded = self.cassette.get(f"https://{lcode}.wiktionary.org/wiki/{quote(title)}{suffix}")
+            if recorded is not None:
+                status, body = recorded
+                return body if status == 200 else None
+        return None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        params = dict(request.query)
+        self.requests.append(params)
+        html = self.page(request.match_info["lcode"], params["page"])
+        if html is None:
+            return web.json_response({"error": {"code": "missingtitle"}})
+
+        sections = parse_sections(html)
+        if params["prop"] == "sections":
+            return web.json_response(
+                {
+                    "parse": {
+                        "title": params["page"],
+                        "sections": [
+                            {"level": str(level), "anchor": anchor, "index": str(idx)}
+                            for idx, (level, anchor, _) in enumerate(sections, 1)
+                        ],
+                    }
+                }
+            )
+
+        index = int(params["section"]) - 1
+        level, _, start = sections[index]
+        end = html.index(b"</main>")
+        for next_level, _, offset in sections[index + 1 :]:
+            if next_level <= level:
+                end = offset
+                break
+        text = '<div class="mw-content-ltr mw-parser-output">' + html[start:end].decode() + "</div>"
+        return web.Response(
+            text=json.dumps({"parse": {"title": params["page"], "text": text}}, ensure_ascii=False),
+            content_type="application/json",
+        )
+
+
+@pytest_asyncio.fixture()
+async def stub_api():
+    api = StubApi()
+    app = web.Application()
+    app.router.add_get("/{lcode}/w/api.php", api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    api.host = f"{host}:{port}"
+    api.url = f"http://{api.host}/{{lcode}}/w/api.php"
+    yield api
+    configure_parse_api(None)
+    await runner.cleanup()
+
+
+VERBS = ["αγαπώ", "αγαπάω", "περπατώ", "περπατάω", "χαραλώνω", "βρέχω", "βρίσκομαι", "ξέρω", "είμαι"]
+
+
+@pytest.mark.asyncio()
+async def test_parse_api_conjugation(stub_api):
+    metrics = get_metrics()
+    page_bytes = metrics.count("upstream_bytes", host="el.wiktionary.org")
+    from_pages = [await fetch_conjugation(verb) for verb in VERBS]
+    page_bytes = metrics.count("upstream_bytes", host="el.wiktionary.org") - page_bytes
+
+    configure_parse_api(stub_api.url)
+    api_bytes = metrics.count("upstream_bytes", host=stub_api.host)
+    from_api = [await fetch_conjugation(verb) for verb in VERBS]
+    api_bytes = metrics.count("upstream_bytes", host=stub_api.host) - api_bytes
+
+    assert from_api == from_pages
+    # Only the conjugation subsection is fetched, when there is one.
+    texts = [request for request in stub_api.requests if request["prop"] == "text"]
+    agapo = next(request for request in texts if request["page"] == "αγαπώ")
+    assert agapo["section"] != "1"
+    # An order of magnitude less than the whole pages.
+    assert api_bytes * 10 < page_bytes
+
+
+@pytest.mark.asyncio()
+async def test_parse_api_language_section(stub_api):
+    configure_parse_api(stub_api.url)
+    entries = await fetch_wiktionary_pos("τραπέζι", "greek")
+    assert "Ετυμολογία" in entries
+    assert "Ουσιαστικό" in entries
+    assert [request["prop"] for request in stub_api.requests] == ["sections", "text"]
+    assert stub_api.requests[1]["section"] == "1"
+
+    # A page without a section of the language: back to the whole page.
+    entries = await fetch_wiktionary_pos("table", "english")
+    assert "Noun" in entries
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from wordref.prefetch import RandomEntryPool
+from wordref.wordref import Wordref
+from worker import configure_worker_pool
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+@pytest.mark.asyncio()
+async def test_random_entry_pool(monkeypatch):
+    fetched = []
+
+    async def fake_try_fetch_embed(self: Wordref):
+        await asyncio.sleep(0)
+        fetched.append(len(fetched))
+        # Every other random page is rejected.
+        return None if len(fetched) % 2 else f"embed {len(fetched)}"
+
+    monkeypatch.setattr(Wordref, "try_fetch_embed", fake_try_fetch_embed)
+
+    pool = RandomEntryPool(True, True, 1, 3, size=4, low_water=2)
+    task = asyncio.create_task(pool.run())
+    try:
+        while not pool.queue.full():
+            await asyncio.sleep(0)
+        assert len(fetched) == 8
+
+        # Above the low-water mark: no refill.
+        assert pool.take() == "embed 2"
+        assert pool.take() == "embed 4"
+        await asyncio.sleep(0.01)
+        assert len(fetched) == 8
+
+        # Below the low-water mark: refill up to the size of the pool.
+        assert pool.take() == "embed 6"
+        while not pool.queue.full():
+            await asyncio.sleep(0)
+        assert len(fetched) == 14
+    finally:
+        task.cancel()
+
+
+@pytest.mark.asyncio()
+async def test_random_command_empty_pool(monkeypatch):
+    import rbot
+
+    calls = []
+
+    class Response:
+        async def defer(self, ephemeral=False, thinking=False):
+            calls.append("defer")
+
+        async def send_message(self, *args, **kwargs):
+            calls.append("send_message")
+
+    class Followup:
+        async def send(self, *args, embed=None, **kwargs):
+            calls.append(("followup", embed))
+
+    class Interaction:
+        response = Response()
+        followup = Followup()
+
+    async def fake_fetch_embed(self: Wordref):
+        calls.append("fetch")
+        return "live embed"
+
+    monkeypatch.setattr(Wordref, "fetch_embed", fake_fetch_embed)
+    pool = configure_worker_pool(workers=1)
+    try:
+        # Prefetched: answered right away.
+        rbot.random_pools[True].queue.put_nowait("prefetched embed")
+        await rbot.random_command(Interaction(), gr_en=True)
+        assert calls == ["send_message"]
+
+        # Empty: deferred before the live fetch, answered with a followup.
+        calls.clear()
+        await rbot.random_command(Interaction(), gr_en=True)
+        await pool.join()
+        assert calls == ["defer", "fetch", ("followup", "live embed")]
+    finally:
+        await pool.stop()
@@ -1,17 +1,31 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from bs4 import BeautifulSoup
+
+from cache import UpstreamError
+from pronunciation.forvo import Forvo
 from pronunciation.pronunciation import get_pronunciation
 from utils import NotFoundException, fix_greek_spelling
 
+pytest_plugins = ("pytest_asyncio",)
+
+FIXTURES = Path(__file__).parent / "fixtures" / "forvo"
+
 
-def test_existing_pronunciation():
+@pytest.mark.asyncio()
+async def test_existing_pronunciation():
     word = "ευχαριστώ"
-    message, _ = get_pronunciation(word)
+    message, _ = await get_pronunciation(word)
     assert message == "Word: ευχαριστώ\nIPA: ef.xa.ɾiˈsto\n"
 
 
-def test_non_existing_pronunciation():
+@pytest.mark.asyncio()
+async def test_non_existing_pronunciation():
     word = "μπλαμπλα"
     try:
-        get_pronunciation(word)
+        await get_pronunciation(word)
         assert False, "Expected NotFoundException but no exception was raised."
     except NotFoundException:
         pass  # Test passes if NotFoundException is raised
@@ -19,12 +33,49 @@ def test_non_existing_pronunciation():
         assert False, f"Expected NotFoundException but got {type(e).__name__}"
 
 
-def test_retry_pronunciation():
+@pytest.mark.asyncio()
+async def test_retry_pronunciation():
     word = "ευχαριστω"
     try:
-        get_pronunciation(word)
+        await get_pronunciation(word)
         assert False, "Should fail the first time"
     except NotFoundException:
-        word = fix_greek_spelling(word)
-        message, _ = get_pronunciation(word)
+        word = await fix_greek_spelling(word)
+        message, _ = await get_pronunciation(word)
         assert message == "Word: ευχαριστώ\nIPA: ef.xa.ɾiˈsto\n"
+
+
+def test_forvo_parse_fixture():
+    forvo = Forvo("ευχαριστώ", "el")
+    forvo.html = BeautifulSoup((FIXTURES / "efcharisto.html").read_bytes(), "html.parser")
+    pronunciations = forvo.get_pronunciations().pronunciations
+
+    assert [p.user for p in pronunciations] == ["jsgeorgia", "Mandy", "kosmas"]
+    assert pronunciations[0].id == 3254877
+    assert pronunciations[0].votes == 3
+    assert pronunciations[0].download_url.startswith("https://audio00.forvo.com/audios/mp3/")
+
+    forvo = Forvo("ευχαριστώ", "fr")
+    forvo.html = BeautifulSoup((FIXTURES / "efcharisto.html").read_bytes(), "html.parser")
+    with pytest.raises(NotFoundException):
+        forvo.get_pronunciations()
+
+
+@pytest.mark.asyncio()
+async def test_forvo_forbidden(monkeypatch):
+    attempts = 0
+
+    async def forbidden(self):
+        nonlocal attempts
+        attempts += 1
+        raise UpstreamError("https://forvo.com/search/ευχαριστώ", 403)
+
+    monkeypatch.setattr(Forvo, "_load_search_query", forbidden)
+
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(asyncio, "sleep", no_sleep)
+    with pytest.raises(UpstreamError):
+        await Forvo("ευχαριστώ", "el").load_search_query()
+    assert attempts == 3
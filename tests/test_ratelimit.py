@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+
+from metrics import get_metrics
+from ratelimit import BACKGROUND, INTERACTIVE, Rate, RateLimiter, rates_from_config, set_priority
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+def test_rates_from_config():
+    rates = rates_from_config({"RATE_LIMITS": "forvo.com=0.5/2, example.org=3/6"})
+    assert rates["forvo.com"] == Rate(0.5, 2)
+    assert rates["example.org"] == Rate(3.0, 6)
+    assert rates["www.wordreference.com"] == Rate(2.0, 5)
+
+
+@pytest.mark.asyncio()
+async def test_rate_limiter():
+    limiter = RateLimiter({"forvo.com": Rate(50.0, 2)})
+    served = []
+
+    async def request(name: str, priority: int) -> None:
+        set_priority(priority)
+        await limiter.acquire(f"https://forvo.com/word/{name}")
+        served.append(name)
+
+    start = time.perf_counter()
+    # The burst is served at once, the others wait, the interactive ones first.
+    await asyncio.gather(
+        request("burst1", BACKGROUND),
+        request("burst2", BACKGROUND),
+        request("prefetch1", BACKGROUND),
+        request("prefetch2", BACKGROUND),
+        request("user1", INTERACTIVE),
+        request("user2", INTERACTIVE),
+    )
+    elapsed = time.perf_counter() - start
+
+    assert served == ["burst1", "burst2", "user1", "user2", "prefetch1", "prefetch2"]
+    # 4 requests over the burst, at 50 per second.
+    assert 0.06 < elapsed < 0.5
+    assert get_metrics().gauge("ratelimit_queue_depth", host="forvo.com") == 0
+    wait = get_metrics().quantile("ratelimit_wait_seconds", 0.95, host="forvo.com", priority="background")
+    assert wait is not None and wait > 0.05
+
+    # Local servers are not limited.
+    start = time.perf_counter()
+    await asyncio.gather(*[limiter.acquire("http://127.0.0.1:8080/") for _ in range(20)])
+    assert time.perf_counter() - start < 0.05
+
+
+@pytest.mark.asyncio()
+async def test_rate_limiter_cancelled():
+    limiter = RateLimiter({"forvo.com": Rate(10.0, 1)})
+    await limiter.acquire("https://forvo.com/word/burst")
+
+    waiting = [asyncio.create_task(limiter.acquire(f"https://forvo.com/word/{idx}")) for idx in range(3)]
+    await asyncio.sleep(0)
+    assert get_metrics().gauge("ratelimit_queue_depth", host="forvo.com") == 3
+
+    # The cancelled waiters leave the queue at once.
+    for task in waiting[:2]:
+        task.cancel()
+    await asyncio.gather(*waiting[:2], return_exceptions=True)
+    assert get_metrics().gauge("ratelimit_queue_depth", host="forvo.com") == 1
+
+    await waiting[2]
+    assert get_metrics().gauge("ratelimit_queue_depth", host="forvo.com") == 0
+
+    # Nobody left waiting: the dispatcher stops instead of sleeping for a token.
+    waiting = asyncio.create_task(limiter.acquire("https://forvo.com/word/last"))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    bucket = limiter.buckets["forvo.com"]
+    await asyncio.sleep(0)
+    assert bucket.waiters == []
+    assert bucket.dispatcher.done()
@@ -0,0 +1,40 @@
+import pytest
+
+import cache
+from cache import Page, fetch_page
+from replay import Cassette, StubServer
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+@pytest.mark.asyncio()
+async def test_record_replay(tmp_path, monkeypatch):
+    path = tmp_path / "cassette.json"
+    cassette = Cassette(path)
+    cassette.record(Page("https://el.wiktionary.org/wiki/χαρά?b=1&a=2", 200, "χαρά".encode()))
+    cassette.record(Page("https://el.wiktionary.org/wiki/μπλαμπλα", 404, b""))
+    # Local servers are not recorded.
+    cassette.record(Page("http://127.0.0.1:8080/wiki/χαρά", 200, b"local"))
+    cassette.save()
+
+    server = StubServer(Cassette(path))
+    server.start()
+    recorded = Cassette(tmp_path / "recorded.json")
+    monkeypatch.setattr(cache, "_upstream_url", server.upstream_url)
+    monkeypatch.setattr(cache, "_on_response", recorded.record)
+    try:
+        # Same page, differently written url.
+        page = await fetch_page("https://el.wiktionary.org/wiki/%CF%87%CE%B1%CF%81%CE%AC?a=2&b=1")
+        assert (page.status, page.text) == (200, "χαρά")
+        page = await fetch_page("https://el.wiktionary.org/wiki/μπλαμπλα")
+        assert page.status == 404
+        assert server.misses == []
+
+        page = await fetch_page("https://el.wiktionary.org/wiki/λύπη")
+        assert page.status == 404
+        assert server.misses == ["https://el.wiktionary.org/wiki/%CE%BB%CF%8D%CF%80%CE%B7"]
+    finally:
+        server.stop()
+
+    assert len(recorded) == 3
+    assert recorded.get("https://el.wiktionary.org/wiki/χαρά?a=2&b=1") == (200, "χαρά".encode())
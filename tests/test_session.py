@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from metrics import get_metrics
+from session import SessionManager, close_session, get_session
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+@pytest.mark.asyncio()
+async def test_pooled_sessions():
+    encodings = []
+
+    async def handler(request: web.Request) -> web.Response:
+        encodings.append(request.headers.get("Accept-Encoding"))
+        response = web.Response(text="χαρά " * 1000)
+        response.enable_compression()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    url = f"http://{host}:{port}/"
+    netloc = f"{host}:{port}"
+
+    try:
+        # One session per host, shared by its requests.
+        assert get_session(url) is get_session(url + "other")
+        assert get_session(url) is not get_session("https://forvo.com/word/")
+
+        metrics = get_metrics()
+        reused = metrics.count("pool_connections", host=netloc, result="reused")
+        for _ in range(3):
+            async with get_session(url).get(url) as response:
+                assert response.headers["Content-Encoding"] in ("gzip", "deflate")
+                assert await response.text() == "χαρά " * 1000
+        assert encodings[0].startswith("gzip, deflate")
+        # Kept alive between the requests.
+        assert metrics.count("pool_connections", host=netloc, result="new") == 1
+        assert metrics.count("pool_connections", host=netloc, result="reused") == reused + 2
+        assert metrics.gauge("pool_requests_in_flight", host=netloc) == 0
+    finally:
+        await close_session()
+        await runner.cleanup()
+
+
+def test_sessions_of_a_previous_loop():
+    manager = SessionManager()
+
+    async def get():
+        return manager.get("forvo.com")
+
+    async def renew():
+        session = manager.get("forvo.com")
+        await asyncio.gather(*manager.closing)
+        return session
+
+    first, second = asyncio.new_event_loop(), asyncio.new_event_loop()
+    try:
+        old = first.run_until_complete(get())
+        # A new loop gets new sessions, and the ones of the previous loop are closed.
+        new = second.run_until_complete(renew())
+        assert new is not old
+        assert old.closed and not new.closed
+        second.run_until_complete(manager.close())
+        assert new.closed
+    finally:
+        first.close()
+        second.close()
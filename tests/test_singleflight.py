@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+import wiktionary.wiktionary
+import wordref.wordref
+from singleflight import SingleFlight
+from wiktionary.wiktionary import fetch_conjugation
+from wordref.wordref import Wordref, entry_cache
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+def count_fetches(monkeypatch, module) -> list[str]:
+    requested = []
+    fetch_page = module.fetch_page
+
+    async def counting_fetch_page(url, *args, **kwargs):
+        requested.append(url)
+        return await fetch_page(url, *args, **kwargs)
+
+    monkeypatch.setattr(module, "fetch_page", counting_fetch_page)
+    return requested
+
+
+@pytest.mark.asyncio()
+async def test_single_flight():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def work() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    assert await asyncio.gather(*[flight.do("key", work) for _ in range(3)]) == [1, 1, 1]
+    assert flight.saved == 2
+    # Done calls are not cached.
+    assert await flight.do("key", work) == 2
+
+    async def fail() -> None:
+        await asyncio.sleep(0.01)
+        raise ValueError
+
+    results = await asyncio.gather(flight.do("fail", fail), flight.do("fail", fail), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+    # The first caller giving up does not cancel the call for the others.
+    first = asyncio.ensure_future(flight.do("key", work))
+    second = asyncio.ensure_future(flight.do("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == 3
+
+
+@pytest.mark.asyncio()
+async def test_coalesced_lookups(monkeypatch):
+    requested = count_fetches(monkeypatch, wiktionary.wiktionary)
+    saved = fetch_conjugation.flight.saved
+    results = await asyncio.gather(*[fetch_conjugation(word) for word in ["ξέρω", "ξέρω", " ξέρω"]])
+    assert results[0] is not None
+    assert results[0] == results[1] == results[2]
+    assert requested == ["https://el.wiktionary.org/wiki/ξέρω"]
+    assert fetch_conjugation.flight.saved == saved + 2
+
+    requested = count_fetches(monkeypatch, wordref.wordref)
+    entry_cache.clear()
+    entries = await asyncio.gather(
+        Wordref("ημερήσιος", True, True, 1, 5).try_fetch_entry(),
+        Wordref("ημερησιος", True, False, 0, 2).try_fetch_entry(),
+    )
+    assert len(requested) == 1
+    assert entries[0].gr_word == entries[1].gr_word == "ημερήσιος"
+    assert entries[0].hide_words != entries[1].hide_words
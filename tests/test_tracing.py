@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+import tracing
+from tracing import Tracer, event, span
+from wordref.wordref import Wordref, entry_cache
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+@pytest.mark.asyncio()
+async def test_trace_command(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "_tracer", Tracer(str(path), sample_rate=1.0))
+    entry_cache.clear()
+
+    with span("command", command="searchgr"):
+        embed = await Wordref("ημερήσιος", True, True, 1, 5).try_fetch_embed()
+    assert embed is not None
+
+    spans = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    by_name = {s["name"]: s for s in spans}
+    # The root is exported last, with its children.
+    assert spans[-1]["name"] == "command"
+    assert spans[-1]["parent_id"] is None
+    assert {s["trace_id"] for s in spans} == {spans[-1]["trace_id"]}
+    assert {"fetch", "wordref.parse_entry", "wordref.validate", "wordref.add_embed"} <= set(by_name)
+
+    fetch = by_name["fetch"]
+    assert fetch["parent_id"] == spans[-1]["span_id"]
+    assert fetch["attributes"]["status"] == 200
+    assert fetch["duration"] >= 0
+    events = [e["name"] for e in by_name["command"]["events"]]
+    assert events == ["wordref.valid_entry", "wordref.valid_embed"]
+
+
+def test_sampling(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "_tracer", Tracer(str(path), sample_rate=0.0))
+    with span("command") as root:
+        with span("stage") as child:
+            event("dropped")
+    assert not root.sampled and not child.sampled
+    assert child.events == []
+    assert not path.exists()
+
+    # Errors are recorded, and still raised.
+    monkeypatch.setattr(tracing, "_tracer", Tracer(str(path), sample_rate=1.0))
+    with pytest.raises(ValueError):
+        with span("command"):
+            raise ValueError("upstream is down")
+    assert json.loads(path.read_text(encoding="utf-8"))["error"] == "ValueError('upstream is down')"
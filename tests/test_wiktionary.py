@@ -1,12 +1,26 @@
 import asyncio
+from pathlib import Path
 
 import pytest
+from bs4 import BeautifulSoup
 
-from wiktionary.wiktionary import fetch_conjugation, fetch_wiktionary_pos
+import wiktionary.wiktionary
+from wiktionary.wiktionary import (
+    WiktionaryQuery,
+    _first_conjugation,
+    _parse_conjugation,
+    fetch_conjugation,
+    fetch_wiktionary_pos,
+    parse_suggestions,
+    parse_wiktionary_pos,
+    slice_language_section,
+)
 
 # https://stackoverflow.com/questions/70015634/how-to-test-async-function-using-pytest
 pytest_plugins = ("pytest_asyncio",)
 
+FIXTURES = Path(__file__).parent / "fixtures" / "wiktionary"
+
 
 @pytest.mark.asyncio()
 async def test_wiktionary_fetch_conjugation():
@@ -65,3 +79,129 @@ async def test_wiktionary_fetch_word_english():
     for result in results:
         assert "Etymology" in result
         assert "Noun" in result
+
+
+def test_wiktionary_parse_fixtures():
+    query = WiktionaryQuery.from_html("τραπέζι", "greek", (FIXTURES / "el_trapezi.html").read_bytes())
+    result = parse_wiktionary_pos(query, "greek")
+    assert "Ετυμολογία" in result
+    assert "Ουσιαστικό" in result
+
+    query = WiktionaryQuery.from_html("table", "english", (FIXTURES / "en_table.html").read_bytes())
+    result = parse_wiktionary_pos(query, "english")
+    assert "Etymology" in result
+    assert "Noun" in result
+
+    # Table structures one and two.
+    query = WiktionaryQuery.from_html("αγαπώ", "greek", (FIXTURES / "el_agapo.html").read_bytes())
+    conjugation = _parse_conjugation(query)
+    assert conjugation is not None
+    assert conjugation["Αόριστος"].split("\n")[0] == "αγάπησα"
+    query = WiktionaryQuery.from_html("ξέρω", "greek", (FIXTURES / "el_xero.html").read_bytes())
+    conjugation = _parse_conjugation(query)
+    assert conjugation is not None
+    assert list(conjugation) == ["Ενεστώτας", "Παρατατικός"]
+
+
+def test_wiktionary_slice_matches_full_page():
+    for path in sorted(FIXTURES.glob("el_*.html")):
+        html = path.read_bytes()
+        sliced = WiktionaryQuery.from_html(path.stem, "greek", html)
+        full = WiktionaryQuery.from_html(path.stem, "greek", html)
+        full.soup = BeautifulSoup(html, "html.parser")
+        WiktionaryQuery.remove_ancient_greek(full.soup, "greek")
+
+        assert len(str(sliced.soup)) <= len(str(full.soup)), path.name
+        assert parse_wiktionary_pos(sliced, "greek") == parse_wiktionary_pos(full, "greek"), path.name
+        assert _parse_conjugation(sliced) == _parse_conjugation(full), path.name
+        assert parse_suggestions(sliced) == parse_suggestions(full), path.name
+
+
+def test_wiktionary_slice_language_section():
+    def section(language: str, body: str) -> str:
+        heading = f'<div class="mw-heading mw-heading2"><h2 id="{language}">{language}</h2></div>'
+        return heading + body
+
+    page = (
+        '<html><body><main><div class="mw-content-ltr mw-parser-output">'
+        + section("English", '<h3 id="Noun">Noun</h3><ol><li>english</li></ol>')
+        + section("Ancient_Greek", '<h3 id="Noun_2">Noun</h3><ol><li>ancient</li></ol>')
+        + section("Greek", '<h3 id="Noun_3">Noun</h3><ol><li>greek</li></ol>')
+        + "</div></main><footer>footer</footer></body></html>"
+    ).encode()
+
+    sliced = slice_language_section(page, "english")
+    assert sliced is not None
+    assert b"greek" in sliced
+    assert b"english" not in sliced
+    assert b"ancient" not in sliced
+    assert b"footer" not in sliced
+
+    # No section of that language: the whole page is parsed.
+    assert slice_language_section(page, "greek") is None
+    query = WiktionaryQuery.from_html("λέξη", "greek", page)
+    assert "english" in query.soup.text
+
+
+@pytest.mark.asyncio()
+async def test_wiktionary_first_conjugation(monkeypatch):
+    # Seconds before the page of every suggestion arrives, and whether it has a conjugation.
+    pages = {"α": (0.05, False), "β": (0.1, True), "γ": (0.01, True), "δ": (5.0, False), "ε": (5.0, True)}
+    finished = []
+
+    async def create(word, language, printable=True, section=None):
+        delay, _ = pages[word]
+        await asyncio.sleep(delay)
+        finished.append(word)
+        return WiktionaryQuery.from_html(word, language, b"")
+
+    def parse_conjugation(query):
+        return {"Ενεστώτας": query.word} if pages[query.word][1] else None
+
+    monkeypatch.setattr(WiktionaryQuery, "create", create)
+    monkeypatch.setattr(wiktionary.wiktionary, "_parse_conjugation", parse_conjugation)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    # γ is the first to arrive, but β comes before it.
+    assert await _first_conjugation(list(pages)) == {"Ενεστώτας": "β"}
+    # δ and ε can not win anymore: cancelled, instead of waited for.
+    assert loop.time() - start < 1.0
+    assert finished == ["γ", "α", "β"]
+
+    assert await _first_conjugation(["α"]) is None
+    assert await _first_conjugation([]) is None
+
+    # A suggestion failing to fetch loses, without failing the others.
+    pages["ζ"] = (0.0, True)
+
+    async def failing_create(word, language, printable=True, section=None):
+        if word == "ζ":
+            raise ConnectionError(word)
+        return await create(word, language, printable, section)
+
+    monkeypatch.setattr(WiktionaryQuery, "create", failing_create)
+    assert await _first_conjugation(["ζ", "α", "β"]) == {"Ενεστώτας": "β"}
+
+
+def test_wiktionary_page_index():
+    def heading(level: int, heading_id: str) -> str:
+        return f'<div class="mw-heading mw-heading{level}"><h{level} id="{heading_id}">{heading_id}</h{level}></div>'
+
+    html = (
+        '<div class="mw-content-ltr mw-parser-output">'
+        + heading(3, "Ουσιαστικό")
+        + "<p>τραπέζι</p><ol><li>έπιπλο</li></ol>"
+        + heading(3, "Ουσιαστικό_3")
+        + "<ol><li>τράπεζα</li></ol>"
+        + heading(4, "Μεταφράσεις")
+        + '<ul><li>→ δείτε τη λέξη <a title="τράπεζα">τράπεζα</a></li></ul>'
+        + "</div>"
+    )
+    query = WiktionaryQuery.from_html("τραπέζι", "greek", html)
+    assert list(query.index.headings) == ["Ουσιαστικό", "Ουσιαστικό_3", "Μεταφράσεις"]
+
+    # Any numbered heading of an entry is found, with the body of its section only.
+    result = parse_wiktionary_pos(query, "greek")
+    assert result == {"Ουσιαστικό": ["τραπέζι", "έπιπλο"], "Ουσιαστικό_3": ["τράπεζα"]}
+    assert parse_suggestions(query) == ["τράπεζα"]
@@ -1,7 +1,40 @@
-from wordref.wordref import Wordref
+from pathlib import Path
 
+import pytest
 
-def test_wordref():
+import wordref.wordref
+from cache import Page
+from wordref.wordref import AttributeStripper, Wordref, entry_cache, fetch_embed_fixing_spelling, parse_words
+
+pytest_plugins = ("pytest_asyncio",)
+
+FIXTURES = Path(__file__).parent / "fixtures" / "wordref"
+
+CHARA_HTML = """
+<table class="WRD">
+  <tr class="even"><td class="FrWrd"><strong>χαρά</strong> ουσ θηλ</td><td class="ToWrd">joy n</td></tr>
+  <tr class="even"><td class="FrEx">Her joy was obvious.</td></tr>
+  <tr class="even"><td class="ToEx">Η χαρά της ήταν φανερή.</td></tr>
+</table>
+"""
+
+
+def mock_wordref_pages(monkeypatch, pages: dict[str, str]) -> list[str]:
+    """Serve pages (keyed by Wordref path) instead of requesting Wordref. Return the requested paths."""
+    requested = []
+
+    async def fake_fetch_page(url: str) -> Page:
+        path = url.removeprefix(f"{Wordref.wordref_url}/")
+        requested.append(path)
+        return Page(url, 200, pages.get(path, "<html></html>").encode())
+
+    monkeypatch.setattr(wordref.wordref, "fetch_page", fake_fetch_page)
+    entry_cache.clear()
+    return requested
+
+
+@pytest.mark.asyncio()
+async def test_wordref():
     word = "ημερήσιος"
     gr_en = True
     hide_words = True
@@ -9,7 +42,7 @@ def test_wordref():
     max_sentences_shown = 5
 
     wordref = Wordref(word, gr_en, hide_words, min_sentences_shown, max_sentences_shown)
-    entry = wordref.try_fetch_entry()
+    entry = await wordref.try_fetch_entry()
 
     assert entry.gr_en == gr_en
     assert entry.hide_words == hide_words
@@ -21,3 +54,66 @@ def test_wordref():
     # FIXME: the last one should not be a synonym
     en_synonyms = {"daily", "quotidian", "diurnal", "μη διαθέσιμη μετάφραση"}
     assert entry.en_synonyms == en_synonyms
+
+
+def test_parse_words():
+    assert parse_words("αγαπάω, αγαπώ ρ μ") == ["αγαπάω", "αγαπώ"]
+    assert parse_words("κουβαλάω ρ μ + πρόθ") == ["κουβαλάω"]
+    assert parse_words("fall in love with vtr + prep") == ["fall in love with"]
+    assert parse_words("love vtr +") == ["love"]
+
+    stripper = AttributeStripper({"adj"})
+    stripper.add("abbr")
+    assert stripper.strip("UN abbr adj") == "UN"
+
+
+def test_wordref_parse_fixture():
+    wordref = Wordref("ημερησιος", True, True, 1, 5)
+    entry = wordref.parse_entry((FIXTURES / "gren_imerisios.html").read_text(encoding="utf-8"))
+
+    assert wordref.word == entry.gr_word == "ημερήσιος"
+    assert entry.gr_pos == "επίθ"
+    assert entry.gr_synonyms == {"ημερήσιος", "ημερήσια διάταξη"}
+    assert entry.en_synonyms == {"daily", "quotidian", "diurnal", "μη διαθέσιμη μετάφραση"}
+    # The "translation not found" example is skipped, the others keep the page order.
+    assert list(entry.sentences) == [
+        "The daily newspaper is delivered every morning.",
+        "The quotidian routine bored him.",
+        "Squirrels are diurnal animals.",
+    ]
+    assert entry.is_valid_entry
+
+
+@pytest.mark.asyncio()
+async def test_wordref_entry_cache(monkeypatch):
+    requested = mock_wordref_pages(monkeypatch, {"gren/χαρα": CHARA_HTML})
+
+    # The rendering options differ between the two calls, but not the parsing.
+    first = await Wordref("χαρα", True, False, 0, 2).fetch_embed()
+    second = await Wordref("ΧΑΡΆ", True, True, 1, 1).fetch_embed()
+
+    assert len(requested) == 1
+    assert first.title == second.title == "∙∙∙∙∙ χαρά - *ουσ θηλ* ∙∙∙∙∙"
+    assert "||joy n||" not in first.description
+    assert "||joy n||" in second.description
+
+    # Invalid entries are not cached: the page may be fixed on the next lookup.
+    requested.clear()
+    assert await Wordref("μπλαμπλα", True, False, 0, 2).fetch_embed() is None
+    assert await Wordref("μπλαμπλα", True, False, 0, 2).fetch_embed() is None
+    assert requested == ["gren/μπλαμπλα", "gren/μπλαμπλα"]
+
+
+@pytest.mark.asyncio()
+async def test_wordref_fixing_spelling(monkeypatch):
+    requested = mock_wordref_pages(monkeypatch, {"gren/χαρα": CHARA_HTML})
+
+    # Greeklish: the greek page gives both the headword and the entry.
+    embed = await fetch_embed_fixing_spelling("xara", True, False, 0, 2)
+    assert embed.title == "∙∙∙∙∙ χαρά - *ουσ θηλ* ∙∙∙∙∙"
+    assert requested == ["engr/xara", "gren/χαρα"]
+
+    # Nothing found, and the headword does not differ: no extra request.
+    requested.clear()
+    assert await fetch_embed_fixing_spelling("μπλαμπλα", True, False, 0, 2) is None
+    assert requested == ["gren/μπλαμπλα"]
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import pytest
+
+import tracing
+from metrics import get_metrics
+from tracing import Tracer
+from worker import WorkerPool, budgets_from_config
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+def test_budgets_from_config():
+    default_budget, budgets = budgets_from_config({"COMMAND_BUDGET": "10", "COMMAND_BUDGET_CONJ": "45"})
+    assert default_budget == 10.0
+    assert budgets["conj"] == 45.0
+
+
+@pytest.mark.asyncio()
+async def test_worker_pool(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "_tracer", Tracer(str(path), sample_rate=1.0))
+    pool = WorkerPool(workers=2, default_budget=0.1, budgets={"slow": 0.01})
+    metrics = get_metrics()
+    before = {
+        outcome: metrics.count("commands", command="test", outcome=outcome) for outcome in ["ok", "error"]
+    }
+    running = 0
+    max_running = 0
+    done = []
+    failures = []
+
+    async def work(idx: int) -> None:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if idx == 3:
+            raise ValueError("upstream is down")
+        done.append(idx)
+
+    async def on_failure(message: str) -> None:
+        failures.append(message)
+
+    for idx in range(6):
+        await pool.submit("test", lambda idx=idx: work(idx), on_failure)
+    await pool.submit("slow", lambda: asyncio.sleep(1), on_failure)
+    await pool.join()
+    await pool.stop()
+
+    # Bounded concurrency, and every job is reported.
+    assert max_running == 2
+    assert sorted(done) == [0, 1, 2, 4, 5]
+    assert failures == ["The command did not succeed.", "The command timed out, try again later."]
+    assert metrics.count("commands", command="test", outcome="ok") == before["ok"] + 5
+    assert metrics.count("commands", command="test", outcome="error") == before["error"] + 1
+    assert metrics.count("commands", command="slow", outcome="timeout") >= 1
+    assert metrics.quantile("command_seconds", 0.5, command="test") is not None
+
+    # The failures are events of the spans of their commands.
+    spans = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    events = {event["name"]: span["attributes"]["command"] for span in spans for event in span["events"]}
+    assert events == {"worker.failed": "test", "worker.timeout": "slow"}